@@ -2,26 +2,53 @@
 API de Generador de Certificados
 Versión 3.0 - Optimizada para producción
 """
-from flask import Flask, request, jsonify, render_template, session, redirect, send_file
+from flask import Flask, Response, request, jsonify, session, redirect, send_file
+from flask.json.provider import JSONProvider
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_cors import CORS
+from flask_compress import Compress
 import logging
 from pythonjsonlogger import jsonlogger
-from datetime import datetime
-from pydantic import ValidationError
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+import csv
+import hashlib
+import hmac
+import msgspec
+import orjson
 import os
+import queue
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import tempfile
+import threading
+import time
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
 
 # Módulos propios
 from config import config
 from database import Database
+from cache import (
+    CacheLocal,
+    contar_certificados_cached,
+    invalidar_contador,
+    obtener_url_cached,
+    guardar_url_cached,
+    cachear_urls
+)
 from cloudinary_storage import CloudinaryStorage
+import local_storage
 from generator import CertificateGenerator
-from schemas import (
-    GenerarCertificadosRequest,
-    ParticipanteSchema
-)
+from pdf_generator import generar_pdf, precalcular_pdf
+from schemas import generar_certificados_decoder, ParticipanteSchema
 from security import (
+    LimitadorLocal,
     require_admin_ip,
     validate_slug,
     validate_cloudinary_url,
@@ -46,67 +73,418 @@ def setup_logging():
     return logging.getLogger(__name__)
 
 
+def _orjson_default(obj):
+    """Serializa tipos que orjson no soporta de forma nativa"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class OrjsonProvider(JSONProvider):
+    """Proveedor JSON de Flask basado en orjson (serialización en C)"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Construye la respuesta directamente desde bytes, sin decodificar a str"""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS),
+            mimetype='application/json'
+        )
+
+
 # Setup
 logger = setup_logging()
 app = Flask(__name__)
 app.secret_key = config.SECRET_KEY
+app.json = OrjsonProvider(app)
+
+# Templates precompilados al arrancar: se renderizan directamente sin el
+# lookup de Flask por request. En producción Jinja no revisa el mtime.
+app.jinja_env.auto_reload = config.DEBUG
+TEMPLATES = {
+    nombre: app.jinja_env.get_template(nombre)
+    for nombre in ('error.html', 'admin_login.html', 'admin_dashboard.html')
+}
+
+
+def render(nombre: str, **context) -> str:
+    """Renderiza un template precompilado"""
+    return TEMPLATES[nombre].render(**context)
+
 
 # CORS
 CORS(app)
 
+# Compresión de respuestas (Brotli si el cliente lo acepta, gzip si no)
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html', 'text/csv']
+app.config['COMPRESS_LEVEL'] = 5
+app.config['COMPRESS_BR_LEVEL'] = 5
+app.config['COMPRESS_MIN_SIZE'] = 512
+Compress(app)
+
+# Limitador local (L1): token bucket por IP que descarta ráfagas evidentes sin
+# consultar el storage del limiter. Se registra antes que Flask-Limiter para
+# ejecutarse primero; el límite real de cada endpoint lo sigue aplicando el limiter.
+limitador_local = LimitadorLocal(capacidad=20, tokens_por_segundo=1.0)
+ENDPOINTS_LIMITADOS = frozenset({
+    'generar_certificados',
+    'ver_certificado',
+    'preview_certificado',
+    'descargar_certificado',
+    'descargar_certificado_pdf',
+    'listar_certificados',
+    'buscar_por_email',
+    'buscar_por_nombre'
+})
+
+
+@app.before_request
+def limitar_rafagas():
+    """Rechaza con 429 las ráfagas por IP antes de llegar al limiter compartido"""
+    # Mismas exenciones que el limiter: las sesiones de admin no consumen tokens
+    if (
+        config.RATELIMIT_ENABLED
+        and request.endpoint in ENDPOINTS_LIMITADOS
+        and not es_admin_autenticado()
+        and not limitador_local.permitir(get_remote_address())
+    ):
+        return respuesta_limite_excedido()
+
+
 # Rate Limiting
+# El storage se pasa al constructor (asignar storage_uri después no tiene efecto);
+# si Redis no responde, el limiter sigue funcionando en memoria.
+usar_redis_limiter = bool(config.RATELIMIT_ENABLED and config.RATELIMIT_STORAGE_URL)
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
-    default_limits=[config.RATELIMIT_DEFAULT] if config.RATELIMIT_ENABLED else []
+    default_limits=[config.RATELIMIT_DEFAULT] if config.RATELIMIT_ENABLED else [],
+    storage_uri=config.RATELIMIT_STORAGE_URL if usar_redis_limiter else 'memory://',
+    storage_options={'socket_keepalive': True, 'max_connections': 50} if usar_redis_limiter else {},
+    strategy=config.RATELIMIT_STRATEGY,
+    in_memory_fallback_enabled=True,
+    swallow_errors=True
 )
-try:
-    if config.RATELIMIT_ENABLED and config.RATELIMIT_STORAGE_URL:
-        limiter.storage_uri = config.RATELIMIT_STORAGE_URL
-        logger.info("Rate limiting habilitado con Redis")
-    else:
-        logger.warning("Rate limiting usando memoria (no recomendado en producción)")
-except Exception as e:
-    logger.warning(f"Rate limiting configurado sin Redis: {e}")
-
-# Inicializar servicios (con fallbacks para permitir arranque)
-db = None
-cloudinary_storage = None
-generator = None
-
-try:
-    db = Database(config.DATABASE_URL)
-    logger.info("Base de datos inicializada")
-except Exception as e:
-    logger.warning(f"Base de datos no disponible: {e}")
-    logger.warning("La app arrancará pero funcionalidad limitada")
-
-try:
-    if config.CLOUDINARY_CLOUD_NAME and config.CLOUDINARY_API_KEY:
-        cloudinary_storage = CloudinaryStorage(
-            cloud_name=config.CLOUDINARY_CLOUD_NAME,
-            api_key=config.CLOUDINARY_API_KEY,
-            api_secret=config.CLOUDINARY_API_SECRET,
-            folder=config.CLOUDINARY_FOLDER
-        )
-        logger.info("Cloudinary inicializado")
-    else:
-        logger.warning("Cloudinary no configurado (configurar variables de entorno)")
-except Exception as e:
-    logger.warning(f"Error al inicializar Cloudinary: {e}")
-
-try:
-    if db and os.path.exists(config.TEMPLATE_PATH):
-        generator = CertificateGenerator(
-            template_path=config.TEMPLATE_PATH,
-            database=db,
-            cloudinary_storage=cloudinary_storage
-        )
-        logger.info("Generador de certificados inicializado")
-    else:
-        logger.warning("Generador no inicializado (requiere DB y template)")
-except Exception as e:
-    logger.warning(f"Error al inicializar generador: {e}")
+if usar_redis_limiter:
+    logger.info("Rate limiting habilitado con Redis")
+else:
+    logger.warning("Rate limiting usando memoria (no recomendado en producción)")
+
+
+@limiter.request_filter
+def es_admin_autenticado() -> bool:
+    """Las sesiones de admin no cuentan contra los límites por IP (sin consultar el storage)"""
+    # Sin cookie de sesión no se toca `session` (evita añadir Vary: Cookie a respuestas públicas)
+    if app.config['SESSION_COOKIE_NAME'] not in request.cookies:
+        return False
+    return bool(session.get('admin_logged_in'))
+
+
+# Servicios (lazy): se inicializan en el primer uso, con fallbacks para permitir arranque.
+# Un fallo de inicialización se recuerda (None) y no se reintenta en cada request.
+_SIN_INICIALIZAR = object()
+_db = _SIN_INICIALIZAR
+_cloudinary_storage = _SIN_INICIALIZAR
+_generator = _SIN_INICIALIZAR
+_db_lock = threading.Lock()
+_cloudinary_lock = threading.Lock()
+_generator_lock = threading.Lock()
+
+
+def get_db():
+    """Obtiene la instancia de Database (None si no está disponible)"""
+    global _db
+    if _db is _SIN_INICIALIZAR:
+        with _db_lock:
+            if _db is _SIN_INICIALIZAR:
+                try:
+                    db = Database(
+                        config.DATABASE_URL,
+                        pool_size=config.DB_POOL_SIZE,
+                        max_overflow=config.DB_MAX_OVERFLOW,
+                        pool_timeout=config.DB_POOL_TIMEOUT,
+                        pool_recycle=config.DB_POOL_RECYCLE,
+                        pool_pre_ping=config.DB_POOL_PRE_PING
+                    )
+                    logger.info("Base de datos inicializada")
+                    threading.Thread(target=_procesar_visitas, name='visitas', daemon=True).start()
+                except Exception as e:
+                    db = None
+                    logger.warning(f"Base de datos no disponible: {e}")
+                    logger.warning("La app funcionará con funcionalidad limitada")
+                _db = db
+    return _db
+
+
+def get_cloudinary():
+    """Obtiene la instancia de CloudinaryStorage (None si no está configurado)"""
+    global _cloudinary_storage
+    if _cloudinary_storage is _SIN_INICIALIZAR:
+        with _cloudinary_lock:
+            if _cloudinary_storage is _SIN_INICIALIZAR:
+                storage = None
+                try:
+                    if config.CLOUDINARY_CLOUD_NAME and config.CLOUDINARY_API_KEY:
+                        storage = CloudinaryStorage(
+                            cloud_name=config.CLOUDINARY_CLOUD_NAME,
+                            api_key=config.CLOUDINARY_API_KEY,
+                            api_secret=config.CLOUDINARY_API_SECRET,
+                            folder=config.CLOUDINARY_FOLDER
+                        )
+                        logger.info("Cloudinary inicializado")
+                    else:
+                        logger.warning("Cloudinary no configurado (configurar variables de entorno)")
+                except Exception as e:
+                    logger.warning(f"Error al inicializar Cloudinary: {e}")
+                _cloudinary_storage = storage
+    return _cloudinary_storage
+
+
+def get_generator():
+    """Obtiene el CertificateGenerator (None si faltan la DB o el template)"""
+    global _generator
+    if _generator is _SIN_INICIALIZAR:
+        with _generator_lock:
+            if _generator is _SIN_INICIALIZAR:
+                generator = None
+                try:
+                    db = get_db()
+                    if db and os.path.exists(config.TEMPLATE_PATH):
+                        generator = CertificateGenerator(
+                            template_path=config.TEMPLATE_PATH,
+                            database=db,
+                            cloudinary_storage=get_cloudinary()
+                        )
+                        logger.info("Generador de certificados inicializado")
+                    else:
+                        logger.warning("Generador no inicializado (requiere DB y template)")
+                except Exception as e:
+                    logger.warning(f"Error al inicializar generador: {e}")
+                _generator = generator
+    return _generator
+
+
+# Cola de visitas: marcar_como_visto se procesa fuera del request
+visitas_queue = queue.SimpleQueue()
+VISITAS_BATCH_SIZE = 200
+VISITAS_FLUSH_INTERVAL = 1.0  # segundos
+
+
+def _procesar_visitas():
+    """Worker que agrupa las visitas encoladas y las guarda en batch"""
+    while True:
+        slugs = [visitas_queue.get()]
+        time.sleep(VISITAS_FLUSH_INTERVAL)
+
+        while len(slugs) < VISITAS_BATCH_SIZE:
+            try:
+                slugs.append(visitas_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            _db.marcar_como_visto_batch(slugs)
+        except Exception as e:
+            logger.error(f"Error al procesar visitas: {e}")
+
+
+# Cache-Control para redirecciones a Cloudinary (la URL de un slug no cambia)
+REDIRECT_CACHE_CONTROL = 'public, max-age=86400'
+
+
+def obtener_cloudinary_url(slug: str):
+    """
+    Obtiene la URL de Cloudinary de un slug, primero desde Redis y
+    luego desde la base de datos (rellenando la caché).
+
+    Returns:
+        URL de Cloudinary o None si el certificado no existe
+    """
+    cloudinary_url = obtener_url_cached(slug)
+    if cloudinary_url:
+        return cloudinary_url
+
+    certificado = get_db().obtener_certificado(slug)
+    if not certificado:
+        return None
+
+    cloudinary_url = certificado.get('cloudinary_url')
+    guardar_url_cached(slug, cloudinary_url)
+    return cloudinary_url
+
+
+# Caché en memoria del SVG (desde Cloudinary) por slug.
+# El contenido de un slug no cambia, así que las entradas no quedan obsoletas.
+# Cada SVG personalizado ocupa ~700KB (texto convertido a paths): se acota por bytes,
+# no por entradas, para no multiplicar cientos de MB por cada worker de gunicorn.
+SVG_MAX_BYTES = 5 * 1024 * 1024  # 5MB
+SVG_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 32MB por worker
+svg_cache = CacheLocal(maxsize=512, ttl=3600, max_bytes=SVG_CACHE_MAX_BYTES)
+
+
+# Sesión HTTP compartida para Cloudinary: reutiliza conexiones (keep-alive, sin TLS por request)
+http = requests.Session()
+http.mount('https://', HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=(502, 503, 504))
+))
+
+
+def obtener_svg(slug: str, cloudinary_url: str):
+    """
+    Obtiene el SVG de un certificado: caché en memoria, disco local y por último Cloudinary
+
+    Args:
+        slug: Slug del certificado
+        cloudinary_url: URL (ya validada) del SVG en Cloudinary
+
+    Returns:
+        Contenido SVG o None si no se pudo descargar
+    """
+    svg_content = svg_cache.get(slug)
+    if svg_content is not None:
+        return svg_content
+
+    # Copia local guardada al generar el certificado
+    svg_content = local_storage.leer_svg(slug)
+    if svg_content is not None:
+        svg_cache.set(slug, svg_content)
+        return svg_content
+
+    try:
+        # Timeouts cortos (conexión 1s, lectura 3s) para prevenir slowloris.
+        # Descarga en streaming: se corta en cuanto supera el máximo (5MB)
+        with http.get(cloudinary_url, timeout=(1, 3), stream=True) as response:
+            response.raise_for_status()
+
+            content_length = response.headers.get('Content-Length')
+            if content_length and content_length.isdigit() and int(content_length) > SVG_MAX_BYTES:
+                logger.error(f"SVG demasiado grande: {content_length} bytes")
+                return None
+
+            buffer = bytearray()
+            for chunk in response.iter_content(65536):
+                buffer += chunk
+                if len(buffer) > SVG_MAX_BYTES:
+                    logger.error(f"SVG demasiado grande: más de {SVG_MAX_BYTES} bytes")
+                    return None
+
+        svg_content = buffer.decode(response.encoding or 'utf-8')
+    except Exception as e:
+        logger.error(f"Error al descargar SVG de Cloudinary: {e}")
+        return None
+
+    svg_cache.set(slug, svg_content)
+    local_storage.guardar_svg(slug, svg_content)
+    return svg_content
+
+
+def obtener_pdf(slug: str, svg_content: str) -> bytes:
+    """
+    Genera el PDF de un certificado y lo guarda localmente para las próximas vistas
+
+    Args:
+        slug: Slug del certificado
+        svg_content: Contenido SVG del certificado
+
+    Returns:
+        Contenido del PDF
+    """
+    pdf_bytes = generar_pdf(svg_content)
+    local_storage.guardar_pdf(slug, pdf_bytes)
+    return pdf_bytes
+
+
+def encolar_preview(slug: str, cloudinary_url: str):
+    """
+    Encola en segundo plano el PNG de vista previa de un certificado que no lo
+    tiene en disco (otra réplica o disco efímero), para servirlo en las próximas vistas
+
+    Args:
+        slug: Slug del certificado
+        cloudinary_url: URL del SVG en Cloudinary
+    """
+    if not config.PRECALCULAR_PDF:
+        return
+
+    # El precálculo lee el SVG del disco: traerlo de Cloudinary si no está
+    if not local_storage.ruta_svg_gz(slug):
+        if not validate_cloudinary_url(cloudinary_url):
+            logger.error(f"URL de Cloudinary inválida: {cloudinary_url}")
+            return
+        # (obtener_svg puede devolverlo desde memoria, sin dejar copia en disco)
+        svg_content = obtener_svg(slug, cloudinary_url)
+        if svg_content is None or not local_storage.guardar_svg(slug, svg_content):
+            return
+
+    # Sin esperar: con la cola llena este request no se bloquea
+    precalcular_pdf(slug, esperar=False)
+
+
+# Prefijo de URL pública de certificados (se concatena con el slug)
+CERT_URL_PREFIX = config.APP_URL.rstrip('/') + '/certificado/'
+
+# Cache-Control para certificados renderizados (el contenido de un slug es inmutable)
+CERTIFICADO_CACHE_CONTROL = 'public, max-age=3600'
+
+# La vista del certificado cuenta visitas (visto / estadísticas del admin): solo la
+# guarda el navegador, así ningún caché compartido responde sin pasar por el origen
+VISTA_CACHE_CONTROL = 'private, max-age=3600'
+
+# Cache para el CDN (CDN-Cache-Control, RFC 9213): el borde guarda los certificados
+# una semana y el origen solo atiende los misses. Los navegadores siguen usando Cache-Control.
+# ver_certificado queda fuera a propósito: una vista servida por el CDN no se contaría.
+CDN_CACHE_CONTROL = 'public, max-age=604800, immutable'
+ENDPOINTS_CACHE_CDN = frozenset({
+    'descargar_certificado_pdf',
+    'descargar_certificado',
+    'preview_certificado'
+})
+
+
+@app.after_request
+def agregar_cache_cdn(response):
+    """Marca como cacheables en el CDN las respuestas exitosas de certificados"""
+    if request.endpoint in ENDPOINTS_CACHE_CDN and response.status_code in (200, 302, 304):
+        response.headers['CDN-Cache-Control'] = CDN_CACHE_CONTROL
+    return response
+
+
+def etag_certificado(certificado: dict) -> str:
+    """Calcula un ETag fuerte a partir del slug y la fecha de generación"""
+    clave = f"{certificado['slug']}:{certificado.get('fecha_generacion')}"
+    return hashlib.blake2b(clave.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def respuesta_no_modificado(etag: str, cache_control: str = CERTIFICADO_CACHE_CONTROL) -> Response:
+    """Respuesta 304 para un certificado que el cliente ya tiene en caché"""
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+# Timestamp del health check, recalculado como máximo cada HEALTH_TS_TTL segundos
+HEALTH_TS_TTL = 0.5
+_health_ts = (0.0, '')
+
+
+def timestamp_health() -> str:
+    """Devuelve el timestamp ISO (UTC) cacheado para /health"""
+    global _health_ts
+    ahora = time.time()
+    if ahora - _health_ts[0] > HEALTH_TS_TTL:
+        _health_ts = (ahora, datetime.fromtimestamp(ahora, timezone.utc).isoformat())
+    return _health_ts[1]
 
 
 # === HEALTH & INFO ===
@@ -114,10 +492,12 @@ except Exception as e:
 @app.route('/', methods=['GET'])
 def index():
     """Información de la API"""
+    db = get_db()
+    cloudinary_storage = get_cloudinary()
     total = 0
     if db:
         try:
-            total = db.contar_certificados()
+            total = contar_certificados_cached(db)
         except:
             total = 0
 
@@ -145,12 +525,19 @@ def index():
 def health():
     """Health check para monitoring"""
     try:
+        db = get_db()
+        cloudinary_storage = get_cloudinary()
         total_certs = 0
         db_status = 'not_configured'
 
         if db:
             try:
-                total_certs = db.contar_certificados()
+                # PostgreSQL: estimación O(1) de pg_class. SQLite no tiene estimación,
+                # así que se usa el contador cacheado en lugar de un COUNT(*) por health check
+                if db.engine.dialect.name == 'postgresql':
+                    total_certs = db.contar_certificados(estimado=True)
+                else:
+                    total_certs = contar_certificados_cached(db)
                 db_status = 'connected'
             except:
                 db_status = 'error'
@@ -160,14 +547,14 @@ def health():
             'database': db_status,
             'cloudinary': 'configured' if cloudinary_storage and cloudinary_storage.configured else 'not_configured',
             'certificados_totales': total_certs,
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': timestamp_health()
         })
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         return jsonify({
             'status': 'degraded',
             'error': str(e),
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': timestamp_health()
         }), 200
 
 
@@ -182,18 +569,17 @@ def generar_certificados():
     Protegido por IP whitelist - Solo para administradores.
     """
     try:
-        data = request.get_json()
-
-        # Validar con Pydantic
+        # Parsear y validar en una sola pasada con msgspec
         try:
-            request_data = GenerarCertificadosRequest(**data)
-        except ValidationError as e:
+            request_data = generar_certificados_decoder.decode(request.get_data(cache=False))
+        except msgspec.DecodeError as e:
             logger.warning(f"Validación fallida: {e}")
-            return jsonify({'error': 'Datos inválidos', 'details': e.errors()}), 400
+            return jsonify({'error': 'Datos inválidos', 'details': str(e)}), 400
 
-        # Generar certificados
-        participantes = [p.dict() for p in request_data.participantes]
-        resultado = generator.generar_batch(participantes)
+        # Generar certificados (el generador accede a los atributos directamente)
+        resultado = get_generator().generar_batch(request_data.participantes)
+        invalidar_contador()
+        cachear_urls(resultado['resultados'])
 
         logger.info(f"Batch generado desde IP {request.remote_addr}: {resultado['exitosos']} exitosos, {resultado['errores']} errores")
 
@@ -218,66 +604,64 @@ def ver_certificado(slug):
     Endpoint público con rate limiting.
     """
     try:
-        from pdf_generator import svg_to_pdf
-        import requests
-
         # Validar slug para prevenir path traversal
         if not validate_slug(slug):
             logger.warning(f"Slug inválido rechazado: {slug}")
-            return render_template('error.html', mensaje='Certificado no encontrado'), 404
+            return render('error.html', mensaje='Certificado no encontrado'), 404
 
         # Buscar en base de datos
-        certificado = db.obtener_certificado(slug)
+        certificado = get_db().obtener_certificado(slug)
 
         if not certificado:
             logger.warning(f"Certificado no encontrado: {slug}")
-            return render_template('error.html', mensaje='Certificado no encontrado'), 404
+            return render('error.html', mensaje='Certificado no encontrado'), 404
 
-        # Marcar como visto
-        db.marcar_como_visto(slug)
+        # Marcar como visto (asíncrono, no bloquea la respuesta)
+        visitas_queue.put_nowait(slug)
 
-        # Obtener contenido SVG desde Cloudinary
-        svg_content = None
-        cloudinary_url = certificado.get('cloudinary_url')
+        # Petición condicional: si el cliente ya tiene esta versión, 304 sin generar PDF
+        etag = etag_certificado(certificado)
+        if request.if_none_match.contains(etag):
+            return respuesta_no_modificado(etag, VISTA_CACHE_CONTROL)
 
-        # Validar URL de Cloudinary para prevenir SSRF
-        if cloudinary_url and not validate_cloudinary_url(cloudinary_url):
-            logger.error(f"URL de Cloudinary inválida: {cloudinary_url}")
-            return render_template('error.html', mensaje='Error de configuración'), 500
+        # PDF ya generado (precalculado al crear el certificado o en una vista anterior)
+        pdf = local_storage.ruta_pdf(slug)
 
-        if cloudinary_url:
-            try:
-                # Timeout reducido de 10s a 3s para prevenir slowloris
-                response = requests.get(cloudinary_url, timeout=3)
-                response.raise_for_status()
-                svg_content = response.text
+        if not pdf:
+            # Obtener contenido SVG desde Cloudinary (o desde la caché)
+            svg_content = None
+            cloudinary_url = certificado.get('cloudinary_url')
 
-                # Verificar tamaño del SVG (máximo 5MB)
-                if len(svg_content) > 5 * 1024 * 1024:
-                    logger.error(f"SVG demasiado grande: {len(svg_content)} bytes")
-                    return render_template('error.html', mensaje='Error al cargar el certificado'), 500
+            # Validar URL de Cloudinary para prevenir SSRF
+            if cloudinary_url and not validate_cloudinary_url(cloudinary_url):
+                logger.error(f"URL de Cloudinary inválida: {cloudinary_url}")
+                return render('error.html', mensaje='Error de configuración'), 500
 
-            except Exception as e:
-                logger.error(f"Error al descargar SVG de Cloudinary: {e}")
+            if cloudinary_url:
+                svg_content = obtener_svg(slug, cloudinary_url)
 
-        if not svg_content:
-            logger.error(f"No se pudo obtener SVG de Cloudinary: {slug}")
-            return render_template('error.html', mensaje='Error al cargar el certificado'), 500
+            if not svg_content:
+                logger.error(f"No se pudo obtener SVG de Cloudinary: {slug}")
+                return render('error.html', mensaje='Error al cargar el certificado'), 500
 
-        # Generar PDF desde SVG
-        pdf_path = svg_to_pdf(svg_content)
+            # Generar PDF desde SVG (se sirve desde memoria, sin archivo temporal)
+            pdf = BytesIO(obtener_pdf(slug, svg_content))
 
         # Servir PDF embebido en el navegador (inline, no como descarga)
-        return send_file(
-            pdf_path,
+        response = send_file(
+            pdf,
             mimetype='application/pdf',
             as_attachment=False,  # Inline para que el navegador lo muestre
-            download_name=f'certificado-{slug}.pdf'
+            download_name=f'certificado-{slug}.pdf',
+            etag=etag,
+            last_modified=datetime.fromisoformat(certificado['fecha_generacion'])
         )
+        response.headers['Cache-Control'] = VISTA_CACHE_CONTROL
+        return response
 
     except Exception as e:
         logger.error(f"Error al ver certificado {slug}: {e}", exc_info=True)
-        return render_template('error.html', mensaje='Error al cargar el certificado'), 500
+        return render('error.html', mensaje='Error al cargar el certificado'), 500
 
 
 @app.route('/preview/<slug>', methods=['GET'])
@@ -293,15 +677,27 @@ def preview_certificado(slug):
             logger.warning(f"Slug inválido rechazado en preview: {slug}")
             return jsonify({'error': 'Certificado no encontrado'}), 404
 
-        certificado = db.obtener_certificado(slug)
+        # PNG precalculado al generar el certificado: se sirve directo, sin renderizar
+        png_path = local_storage.ruta_preview(slug)
+        if png_path:
+            response = send_file(png_path, mimetype='image/png')
+            response.headers['Cache-Control'] = CERTIFICADO_CACHE_CONTROL
+            return response
 
-        if not certificado:
+        cloudinary_url = obtener_cloudinary_url(slug)
+        if not cloudinary_url:
             return jsonify({'error': 'Certificado no encontrado'}), 404
 
+        # Sin PNG local: generarlo para las próximas vistas; esta se sirve desde Cloudinary
+        encolar_preview(slug, cloudinary_url)
+
         # Obtener URL de preview PNG desde Cloudinary
+        cloudinary_storage = get_cloudinary()
         if cloudinary_storage and cloudinary_storage.configured:
             png_url = cloudinary_storage.get_png_url(slug, width=1200, height=675)
-            return redirect(png_url)
+            response = redirect(png_url)
+            response.headers['Cache-Control'] = REDIRECT_CACHE_CONTROL
+            return response
         else:
             return jsonify({'error': 'Preview no disponible'}), 503
 
@@ -314,7 +710,7 @@ def preview_certificado(slug):
 @limiter.limit("20 per minute")  # Protección contra DoS
 def descargar_certificado(slug):
     """
-    Redirige a la URL de Cloudinary para descargar el SVG.
+    Descarga el SVG: desde la copia local comprimida o redirigiendo a Cloudinary.
     Endpoint público con rate limiting.
     """
     try:
@@ -323,19 +719,30 @@ def descargar_certificado(slug):
             logger.warning(f"Slug inválido rechazado en descargar: {slug}")
             return jsonify({'error': 'Certificado no encontrado'}), 404
 
-        certificado = db.obtener_certificado(slug)
+        # Copia local ya comprimida: se sirve tal cual con Content-Encoding: gzip
+        # (sin redirigir a Cloudinary ni comprimir en cada request)
+        svg_gz_path = local_storage.ruta_svg_gz(slug)
+        if svg_gz_path and 'gzip' in request.accept_encodings:
+            response = send_file(svg_gz_path, mimetype='image/svg+xml')
+            response.headers['Content-Encoding'] = 'gzip'
+            response.vary.add('Accept-Encoding')
+            response.headers['Cache-Control'] = CERTIFICADO_CACHE_CONTROL
+            return response
 
-        if not certificado:
-            return jsonify({'error': 'Certificado no encontrado'}), 404
+        cloudinary_url = obtener_cloudinary_url(slug)
 
-        cloudinary_url = certificado.get('cloudinary_url')
+        if not cloudinary_url:
+            return jsonify({'error': 'Certificado no encontrado'}), 404
 
         # Validar URL de Cloudinary
         if not validate_cloudinary_url(cloudinary_url):
             logger.error(f"URL de Cloudinary inválida en descargar: {cloudinary_url}")
             return jsonify({'error': 'Error de configuración'}), 500
 
-        return redirect(cloudinary_url)
+        response = redirect(cloudinary_url)
+        response.headers['Cache-Control'] = REDIRECT_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')  # La misma URL sirve el SVG gzip si hay copia local
+        return response
 
     except Exception as e:
         logger.error(f"Error al descargar certificado {slug}: {e}")
@@ -350,59 +757,57 @@ def descargar_certificado_pdf(slug):
     Endpoint público con rate limiting.
     """
     try:
-        from pdf_generator import svg_to_pdf
-        import requests
-
         # Validar slug
         if not validate_slug(slug):
             logger.warning(f"Slug inválido rechazado en PDF: {slug}")
             return jsonify({'error': 'Certificado no encontrado'}), 404
 
         # Buscar en base de datos
-        certificado = db.obtener_certificado(slug)
+        certificado = get_db().obtener_certificado(slug)
 
         if not certificado:
             logger.warning(f"Certificado no encontrado: {slug}")
             return jsonify({'error': 'Certificado no encontrado'}), 404
 
-        # Obtener contenido SVG desde Cloudinary
-        svg_content = None
-        cloudinary_url = certificado.get('cloudinary_url')
+        # Petición condicional: si el cliente ya tiene esta versión, 304 sin leer ni generar el PDF
+        etag = etag_certificado(certificado)
+        if request.if_none_match.contains(etag):
+            return respuesta_no_modificado(etag)
 
-        # Validar URL de Cloudinary
-        if cloudinary_url and not validate_cloudinary_url(cloudinary_url):
-            logger.error(f"URL de Cloudinary inválida: {cloudinary_url}")
-            return jsonify({'error': 'Error de configuración'}), 500
+        # PDF ya generado (precalculado al crear el certificado o en una vista anterior)
+        pdf = local_storage.ruta_pdf(slug)
 
-        if cloudinary_url:
-            try:
-                # Timeout reducido de 10s a 3s
-                response = requests.get(cloudinary_url, timeout=3)
-                response.raise_for_status()
-                svg_content = response.text
+        if not pdf:
+            # Obtener contenido SVG desde Cloudinary
+            svg_content = None
+            cloudinary_url = certificado.get('cloudinary_url')
 
-                # Verificar tamaño del SVG (máximo 5MB)
-                if len(svg_content) > 5 * 1024 * 1024:
-                    logger.error(f"SVG demasiado grande: {len(svg_content)} bytes")
-                    return jsonify({'error': 'Error al cargar el certificado'}), 500
+            # Validar URL de Cloudinary
+            if cloudinary_url and not validate_cloudinary_url(cloudinary_url):
+                logger.error(f"URL de Cloudinary inválida: {cloudinary_url}")
+                return jsonify({'error': 'Error de configuración'}), 500
 
-            except Exception as e:
-                logger.error(f"Error al descargar SVG de Cloudinary: {e}")
+            if cloudinary_url:
+                svg_content = obtener_svg(slug, cloudinary_url)
 
-        if not svg_content:
-            logger.error(f"No se pudo obtener SVG de Cloudinary: {slug}")
-            return jsonify({'error': 'Error al cargar el certificado'}), 500
+            if not svg_content:
+                logger.error(f"No se pudo obtener SVG de Cloudinary: {slug}")
+                return jsonify({'error': 'Error al cargar el certificado'}), 500
 
-        # Generar PDF
-        pdf_path = svg_to_pdf(svg_content)
+            # Generar PDF (se sirve desde memoria, sin archivo temporal)
+            pdf = BytesIO(obtener_pdf(slug, svg_content))
 
         # Enviar archivo PDF
-        return send_file(
-            pdf_path,
+        response = send_file(
+            pdf,
             mimetype='application/pdf',
             as_attachment=True,
-            download_name=f'certificado-{slug}.pdf'
+            download_name=f'certificado-{slug}.pdf',
+            etag=etag,
+            last_modified=datetime.fromisoformat(certificado['fecha_generacion'])
         )
+        response.headers['Cache-Control'] = CERTIFICADO_CACHE_CONTROL
+        return response
 
     except Exception as e:
         logger.error(f"Error al generar PDF para {slug}: {e}", exc_info=True)
@@ -418,30 +823,58 @@ def listar_certificados():
     try:
         limite = request.args.get('limite', 100, type=int)
         offset = request.args.get('offset', 0, type=int)
+        after_id = request.args.get('after_id', type=int)
 
         # Límite máximo
         if limite > 500:
             limite = 500
 
-        certificados = db.listar_certificados(limite=limite, offset=offset)
-        total = db.contar_certificados()
+        if offset and after_id is None:
+            logger.info("Paginación con offset está obsoleta, usar after_id (next_cursor)")
+
+        db = get_db()
+        certificados = db.listar_certificados(limite=limite, offset=offset, after_id=after_id)
+        total = contar_certificados_cached(db)
 
         # Agregar URL completa
         for cert in certificados:
-            cert['url'] = f"{config.APP_URL}/certificado/{cert['slug']}"
+            cert['url'] = CERT_URL_PREFIX + cert['slug']
 
-        return jsonify({
+        response = jsonify({
             'total': total,
             'limite': limite,
             'offset': offset,
+            'next_cursor': certificados[-1]['id'] if certificados and len(certificados) == limite else None,
             'certificados': certificados
         })
+        response.add_etag()
+        return response.make_conditional(request)
 
     except Exception as e:
         logger.error(f"Error al listar certificados: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+def respuesta_busqueda(certificados: list) -> Response:
+    """
+    Serializa el resultado de una búsqueda en una sola pasada de orjson
+
+    Args:
+        certificados: Certificados (dicts) devueltos por la base de datos
+
+    Returns:
+        Response JSON con total y certificados (con su URL pública)
+    """
+    for cert in certificados:
+        cert['url'] = CERT_URL_PREFIX + cert['slug']
+
+    body = orjson.dumps(
+        {'total': len(certificados), 'certificados': certificados},
+        default=_orjson_default
+    )
+    return Response(body, mimetype='application/json')
+
+
 @app.route('/buscar/email/<email>', methods=['GET'])
 @limiter.limit("30 per minute")
 def buscar_por_email(email):
@@ -449,15 +882,8 @@ def buscar_por_email(email):
     Busca certificados por email
     """
     try:
-        certificados = db.buscar_por_email(email)
-
-        for cert in certificados:
-            cert['url'] = f"{config.APP_URL}/certificado/{cert['slug']}"
-
-        return jsonify({
-            'total': len(certificados),
-            'certificados': certificados
-        })
+        certificados = get_db().buscar_por_email(email)
+        return respuesta_busqueda(certificados)
 
     except Exception as e:
         logger.error(f"Error al buscar por email: {e}")
@@ -471,15 +897,8 @@ def buscar_por_nombre(nombre):
     Busca certificados por nombre
     """
     try:
-        certificados = db.buscar_por_nombre(nombre)
-
-        for cert in certificados:
-            cert['url'] = f"{config.APP_URL}/certificado/{cert['slug']}"
-
-        return jsonify({
-            'total': len(certificados),
-            'certificados': certificados
-        })
+        certificados = get_db().buscar_por_nombre(nombre)
+        return respuesta_busqueda(certificados)
 
     except Exception as e:
         logger.error(f"Error al buscar por nombre: {e}")
@@ -488,6 +907,10 @@ def buscar_por_nombre(nombre):
 
 # === ADMIN PANEL ===
 
+# Clave del admin en bytes, calculada una sola vez para la comparación en tiempo constante
+_ADMIN_PW_BYTES = config.ADMIN_PASSWORD.encode('utf-8')
+
+
 @app.route('/admin', methods=['GET'])
 @require_admin_ip  # Solo IPs autorizadas
 def admin_redirect():
@@ -504,15 +927,15 @@ def admin_login():
     if request.method == 'POST':
         password = request.form.get('password')
 
-        if password == config.ADMIN_PASSWORD:
+        if password and hmac.compare_digest(password.encode('utf-8'), _ADMIN_PW_BYTES):
             session['admin_logged_in'] = True
             logger.info(f"Admin login exitoso desde IP: {request.remote_addr}")
             return redirect('/admin/dashboard')
         else:
             logger.warning(f"Intento de login fallido desde IP: {request.remote_addr}")
-            return render_template('admin_login.html', error='Clave incorrecta')
+            return render('admin_login.html', error='Clave incorrecta')
 
-    return render_template('admin_login.html')
+    return render('admin_login.html')
 
 
 @app.route('/admin/dashboard', methods=['GET'])
@@ -523,8 +946,10 @@ def admin_dashboard():
         return redirect('/admin/login')
 
     try:
+        db = get_db()
+        cloudinary_storage = get_cloudinary()
         certificados = db.listar_certificados(limite=1000)
-        total = db.contar_certificados()
+        total = contar_certificados_cached(db)
 
         # Estadísticas adicionales
         stats = {
@@ -532,7 +957,7 @@ def admin_dashboard():
             'cloudinary_configurado': cloudinary_storage.configured if cloudinary_storage else False,
         }
 
-        return render_template(
+        return render(
             'admin_dashboard.html',
             certificados=certificados,
             stats=stats
@@ -551,9 +976,16 @@ def admin_generar():
 
     try:
         data = request.get_json()
-        participantes = data.get('participantes', [])
 
-        resultado = generator.generar_batch(participantes)
+        # Entrada de confianza (sesión admin): construir sin re-validar
+        participantes = [
+            ParticipanteSchema.model_construct(**p)
+            for p in data.get('participantes', [])
+        ]
+
+        resultado = get_generator().generar_batch(participantes)
+        invalidar_contador()
+        cachear_urls(resultado['resultados'])
 
         return jsonify(resultado)
 
@@ -562,6 +994,23 @@ def admin_generar():
         return jsonify({'error': str(e)}), 500
 
 
+# Tamaño de cada bloque del CSV exportado (una escritura/compresión por bloque, no por fila)
+CSV_CHUNK_SIZE = 64 * 1024
+
+# Filas del Excel entre cada cesión de turno (ver ceder_turno)
+EXPORT_YIELD_ROWS = 500
+
+
+def ceder_turno():
+    """
+    Cede el turno a otros requests durante una exportación larga
+
+    Con workers gevent (wsgi.py aplica monkey.patch_all) time.sleep(0) es
+    gevent.sleep(0) y deja correr a otros greenlets; con hilos libera el GIL.
+    """
+    time.sleep(0)
+
+
 @app.route('/admin/exportar', methods=['GET'])
 @require_admin_ip  # Solo IPs autorizadas
 def admin_exportar():
@@ -569,42 +1018,41 @@ def admin_exportar():
     if 'admin_logged_in' not in session:
         return redirect('/admin/login')
 
-    try:
-        import csv
-        from io import StringIO
-
-        certificados = db.listar_certificados(limite=10000)
-
-        output = StringIO()
-        writer = csv.writer(output)
+    # Las filas se leen mientras se envía la respuesta: un error de la BD a mitad
+    # del export corta la descarga (no hay try/except que pueda devolver un 500)
+    def generar_csv():
+        """Genera el CSV en bloques de ~64KB reutilizando un único buffer"""
+        buffer = StringIO()
+        writer = csv.writer(buffer)
 
         # Header
         writer.writerow(['Nombre', 'Email', 'Slug', 'URL Completa', 'Visto', 'Fecha', 'Cloudinary URL'])
 
         # Datos
-        for cert in certificados:
-            url_completa = f"{config.APP_URL}/certificado/{cert['slug']}"
+        for cert in get_db().iter_certificados(limite=10000):
+            if buffer.tell() >= CSV_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                ceder_turno()
             writer.writerow([
                 cert['nombre'],
                 cert['email'],
                 cert['slug'],
-                url_completa,
+                CERT_URL_PREFIX + cert['slug'],
                 cert['visto'],
                 cert['fecha_generacion'],
                 cert['cloudinary_url']
             ])
 
-        output.seek(0)
-        return send_file(
-            StringIO(output.getvalue()),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'certificados_{datetime.now().strftime("%Y%m%d")}.csv'
-        )
+        yield buffer.getvalue()
 
-    except Exception as e:
-        logger.error(f"Error al exportar: {e}")
-        return f'Error: {e}', 500
+    filename = f'certificados_{datetime.now().strftime("%Y%m%d")}.csv'
+    return Response(
+        generar_csv(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 
 @app.route('/admin/exportar-excel', methods=['GET'])
@@ -615,16 +1063,14 @@ def admin_exportar_excel():
         return redirect('/admin/login')
 
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from io import BytesIO
-
-        certificados = db.listar_certificados(limite=10000)
+        # Workbook en modo write-only: las filas se escriben al disco a medida que se agregan
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Certificados")
 
-        # Crear workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Certificados"
+        # Ajustar ancho de columnas (en write-only debe hacerse antes de escribir filas)
+        column_widths = [30, 35, 25, 60, 10, 20, 60]
+        for col_num, width in enumerate(column_widths, 1):
+            ws.column_dimensions[get_column_letter(col_num)].width = width
 
         # Estilo para el header
         header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
@@ -633,31 +1079,31 @@ def admin_exportar_excel():
 
         # Headers
         headers = ['Nombre', 'Email', 'Slug', 'URL Completa', 'Visto', 'Fecha', 'Cloudinary URL']
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
             cell.fill = header_fill
             cell.font = header_font
             cell.alignment = header_alignment
+            header_cells.append(cell)
+        ws.append(header_cells)
 
         # Datos
-        for row_num, cert in enumerate(certificados, 2):
-            url_completa = f"{config.APP_URL}/certificado/{cert['slug']}"
-            ws.cell(row=row_num, column=1).value = cert['nombre']
-            ws.cell(row=row_num, column=2).value = cert['email']
-            ws.cell(row=row_num, column=3).value = cert['slug']
-            ws.cell(row=row_num, column=4).value = url_completa
-            ws.cell(row=row_num, column=5).value = cert['visto']
-            ws.cell(row=row_num, column=6).value = cert['fecha_generacion']
-            ws.cell(row=row_num, column=7).value = cert['cloudinary_url']
-
-        # Ajustar ancho de columnas
-        column_widths = [30, 35, 25, 60, 10, 20, 60]
-        for col_num, width in enumerate(column_widths, 1):
-            ws.column_dimensions[ws.cell(row=1, column=col_num).column_letter].width = width
+        for i, cert in enumerate(get_db().iter_certificados(limite=10000), 1):
+            if i % EXPORT_YIELD_ROWS == 0:
+                ceder_turno()
+            ws.append([
+                cert['nombre'],
+                cert['email'],
+                cert['slug'],
+                CERT_URL_PREFIX + cert['slug'],
+                cert['visto'],
+                cert['fecha_generacion'],
+                cert['cloudinary_url']
+            ])
 
-        # Guardar en BytesIO
-        output = BytesIO()
+        # Guardar en un archivo temporal anónimo (se elimina al cerrarse tras enviarlo)
+        output = tempfile.TemporaryFile()
         wb.save(output)
         output.seek(0)
 
@@ -689,15 +1135,20 @@ def not_found(e):
     return jsonify({'error': 'Endpoint no encontrado'}), 404
 
 
-@app.errorhandler(429)
-def ratelimit_handler(e):
-    """Handler para rate limiting - no revelar detalles técnicos"""
+def respuesta_limite_excedido():
+    """Respuesta 429 común al limitador local y a Flask-Limiter"""
     return jsonify({
         'error': 'Demasiadas solicitudes',
         'message': 'Has excedido el límite de solicitudes. Intenta de nuevo en unos minutos.'
     }), 429
 
 
+@app.errorhandler(429)
+def ratelimit_handler(e):
+    """Handler para rate limiting - no revelar detalles técnicos"""
+    return respuesta_limite_excedido()
+
+
 @app.errorhandler(500)
 def internal_error(e):
     logger.error(f"Error interno: {e}")
@@ -716,7 +1167,9 @@ if __name__ == '__main__':
             print(f'  {error}')
         print('=' * 60 + '\n')
 
-    # Mostrar info de inicio
+    # Mostrar info de inicio (fuerza la inicialización de los servicios)
+    db = get_db()
+    cloudinary_storage = get_cloudinary()
     print('=' * 60)
     print(f'🚀 {config.APP_NAME} v3.0 iniciado')
     print('=' * 60)
@@ -747,4 +1200,5 @@ if __name__ == '__main__':
         print('   Configura CLOUDINARY_* en Railway')
     print('=' * 60)
 
+    # Servidor de desarrollo (en producción: gunicorn -c gunicorn.conf.py wsgi:application)
     app.run(debug=config.DEBUG, host='0.0.0.0', port=config.PORT)
@@ -0,0 +1,259 @@
+"""
+Caché compartida en Redis para valores calientes (contadores, etc.)
+Si Redis no está disponible se degrada de forma silenciosa a consultar la BD.
+
+Incluye además una caché LRU en memoria (por proceso) para contenido pesado
+como el SVG descargado de Cloudinary y los PDFs generados.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Callable
+
+import redis
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Claves y TTLs
+COUNT_KEY = 'certs:count'
+COUNT_TTL = 10  # segundos
+URL_KEY_PREFIX = 'cert:url:'  # slug -> cloudinary_url (sin TTL, la URL no cambia)
+
+# Tiempo que se deja de intentar conectar tras un fallo de Redis
+RETRY_AFTER = 30  # segundos
+
+_client: Optional[redis.Redis] = None
+_disabled_until = 0.0
+
+
+def get_redis() -> Optional[redis.Redis]:
+    """
+    Obtiene el cliente Redis compartido (se crea en el primer uso)
+
+    Returns:
+        Cliente Redis o None si no está configurado o falló recientemente
+    """
+    global _client
+
+    if not config.REDIS_URL or time.monotonic() < _disabled_until:
+        return None
+
+    if _client is None:
+        try:
+            _client = redis.Redis.from_url(
+                config.REDIS_URL,
+                decode_responses=True,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5
+            )
+        except Exception as e:
+            _marcar_no_disponible(e)
+            return None
+
+    return _client
+
+
+def _marcar_no_disponible(error: Exception):
+    """Desactiva Redis temporalmente para no penalizar cada request"""
+    global _disabled_until
+    _disabled_until = time.monotonic() + RETRY_AFTER
+    logger.warning(f"Redis no disponible, usando base de datos: {error}")
+
+
+def contar_certificados_cached(db) -> int:
+    """
+    Cuenta los certificados usando una caché en memoria y Redis, ambas con TTL corto
+
+    Args:
+        db: Instancia de Database
+
+    Returns:
+        Número total de certificados
+    """
+    total = _contador_local.get(COUNT_KEY)
+    if total is not None:
+        return total
+
+    total = _contar_certificados_redis(db)
+    _contador_local.set(COUNT_KEY, total)
+    return total
+
+
+def _contar_certificados_redis(db) -> int:
+    """Cuenta los certificados usando Redis como caché (o la BD si no está disponible)"""
+    client = get_redis()
+
+    if client is not None:
+        try:
+            value = client.get(COUNT_KEY)
+            if value is not None:
+                return int(value)
+        except redis.RedisError as e:
+            _marcar_no_disponible(e)
+            client = None
+
+    total = db.contar_certificados()
+
+    if client is not None:
+        try:
+            client.setex(COUNT_KEY, COUNT_TTL, total)
+        except redis.RedisError as e:
+            _marcar_no_disponible(e)
+
+    return total
+
+
+def invalidar_contador():
+    """Invalida el contador cacheado (llamar tras generar certificados)"""
+    _contador_local.pop(COUNT_KEY)
+
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        client.delete(COUNT_KEY)
+    except redis.RedisError as e:
+        _marcar_no_disponible(e)
+
+
+def obtener_url_cached(slug: str) -> Optional[str]:
+    """
+    Obtiene la URL de Cloudinary cacheada para un slug
+
+    Args:
+        slug: Slug del certificado
+
+    Returns:
+        URL de Cloudinary o None si no está en caché
+    """
+    client = get_redis()
+    if client is None:
+        return None
+
+    try:
+        return client.get(URL_KEY_PREFIX + slug)
+    except redis.RedisError as e:
+        _marcar_no_disponible(e)
+        return None
+
+
+def guardar_url_cached(slug: str, cloudinary_url: str):
+    """Guarda la URL de Cloudinary de un slug en caché"""
+    client = get_redis()
+    if client is None or not cloudinary_url:
+        return
+
+    try:
+        client.set(URL_KEY_PREFIX + slug, cloudinary_url)
+    except redis.RedisError as e:
+        _marcar_no_disponible(e)
+
+
+def cachear_urls(resultados: List[Dict]):
+    """
+    Guarda en caché las URLs de los certificados generados en un batch
+
+    Args:
+        resultados: Resultados de generar_batch
+    """
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        pipe = client.pipeline(transaction=False)
+        for resultado in resultados:
+            if resultado.get('success') and resultado.get('cloudinary_url'):
+                pipe.set(URL_KEY_PREFIX + resultado['slug'], resultado['cloudinary_url'])
+        pipe.execute()
+    except redis.RedisError as e:
+        _marcar_no_disponible(e)
+
+
+class CacheLocal:
+    """Caché LRU en memoria con TTL, segura entre hilos"""
+
+    def __init__(self, maxsize: int, ttl: float, al_descartar: Optional[Callable[[Any], None]] = None,
+                 max_bytes: Optional[int] = None):
+        """
+        Args:
+            maxsize: Número máximo de entradas
+            ttl: Segundos que una entrada es válida
+            al_descartar: Función llamada con el valor de cada entrada descartada
+            max_bytes: Tamaño total máximo (len() de los valores); None = sin límite
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.al_descartar = al_descartar
+        self.max_bytes = max_bytes
+        self._bytes = 0
+        self._datos: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tamano(self, valor: Any) -> int:
+        return len(valor) if self.max_bytes is not None else 0
+
+    def get(self, clave: str) -> Optional[Any]:
+        """Obtiene un valor (None si no está o expiró)"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                self._bytes -= self._tamano(valor)
+                descartado = valor
+            else:
+                self._datos.move_to_end(clave)
+                return valor
+        self._descartar(descartado)
+        return None
+
+    def set(self, clave: str, valor: Any):
+        """Guarda un valor, descartando los menos usados si se supera maxsize o max_bytes"""
+        tamano = self._tamano(valor)
+        if self.max_bytes is not None and tamano > self.max_bytes:
+            return
+        descartados = []
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= self._tamano(anterior[1])
+                if anterior[1] is not valor:
+                    descartados.append(anterior[1])
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._bytes += tamano
+            while len(self._datos) > self.maxsize or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                descartado = self._datos.popitem(last=False)[1][1]
+                self._bytes -= self._tamano(descartado)
+                descartados.append(descartado)
+        for descartado in descartados:
+            self._descartar(descartado)
+
+    def pop(self, clave: str):
+        """Elimina una entrada si existe"""
+        with self._lock:
+            entrada = self._datos.pop(clave, None)
+            if entrada is not None:
+                self._bytes -= self._tamano(entrada[1])
+        if entrada is not None:
+            self._descartar(entrada[1])
+
+    def _descartar(self, valor: Any):
+        if self.al_descartar is None:
+            return
+        try:
+            self.al_descartar(valor)
+        except Exception as e:
+            logger.warning(f"Error al descartar entrada de caché: {e}")
+
+
+# Contador en memoria: evita el COUNT(*) (o el round-trip a Redis) en cada request.
+# En otros procesos la invalidación llega, como mucho, tras COUNT_TTL segundos.
+_contador_local = CacheLocal(maxsize=1, ttl=COUNT_TTL)
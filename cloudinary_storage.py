@@ -4,11 +4,26 @@ Módulo para manejar almacenamiento en Cloudinary
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
+import cloudinary.exceptions
+from io import BytesIO
 from typing import Optional, Dict, Any
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Intentos de subida ante fallos transitorios (red, 5xx, rate limit), con espera 1 s, 2 s...
+UPLOAD_INTENTOS = 3
+
+# Errores de Cloudinary que no se resuelven reintentando (petición o credenciales inválidas)
+ERRORES_DEFINITIVOS = (
+    cloudinary.exceptions.BadRequest,
+    cloudinary.exceptions.AuthorizationRequired,
+    cloudinary.exceptions.NotAllowed,
+    cloudinary.exceptions.NotFound,
+    cloudinary.exceptions.AlreadyExists,
+)
+
 
 class CloudinaryStorage:
     """Maneja operaciones de almacenamiento en Cloudinary"""
@@ -55,19 +70,31 @@ class CloudinaryStorage:
             return None
 
         try:
-            import tempfile
-            import os
+            result = self._subir_con_reintentos(svg_content.encode('utf-8'), public_id)
+
+            logger.info(f"SVG subido exitosamente: {public_id}")
 
-            # Crear archivo temporal con el SVG
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.svg', delete=False, encoding='utf-8') as tmp:
-                tmp.write(svg_content)
-                tmp_path = tmp.name
+            return {
+                'public_id': result['public_id'],
+                'url': result['secure_url'],
+                'format': result.get('format', 'svg'),
+                'bytes': result.get('bytes', 0),
+                'created_at': result.get('created_at', '')
+            }
 
+        except Exception as e:
+            logger.error(f"Error al subir SVG a Cloudinary: {e}")
+            return None
+
+    def _subir_con_reintentos(self, svg_bytes: bytes, public_id: str) -> Dict[str, Any]:
+        """Sube el SVG reintentando con backoff exponencial los fallos transitorios"""
+        for intento in range(UPLOAD_INTENTOS):
             try:
-                # Subir el archivo temporal a Cloudinary como raw
+                # Subir los bytes del SVG desde memoria como raw (sin base64 ni archivo temporal)
                 # raw permite que el navegador lo muestre inline sin forzar descarga
-                result = cloudinary.uploader.upload(
-                    tmp_path,
+                return cloudinary.uploader.upload(
+                    BytesIO(svg_bytes),
+                    filename=f'{public_id}.svg',
                     folder=self.folder,
                     public_id=public_id,
                     resource_type='raw',  # Usar 'raw' para servir sin procesar
@@ -75,26 +102,14 @@ class CloudinaryStorage:
                     invalidate=True,
                     access_mode='public'  # Acceso público sin forzar descarga
                 )
-
-                logger.info(f"SVG subido exitosamente: {public_id}")
-
-                return {
-                    'public_id': result['public_id'],
-                    'url': result['secure_url'],
-                    'format': result.get('format', 'svg'),
-                    'bytes': result.get('bytes', 0),
-                    'created_at': result.get('created_at', '')
-                }
-            finally:
-                # Limpiar archivo temporal
-                try:
-                    os.unlink(tmp_path)
-                except:
-                    pass
-
-        except Exception as e:
-            logger.error(f"Error al subir SVG a Cloudinary: {e}")
-            return None
+            except ERRORES_DEFINITIVOS:
+                raise
+            except Exception as e:
+                if intento == UPLOAD_INTENTOS - 1:
+                    raise
+                espera = 2 ** intento
+                logger.warning(f"Error al subir {public_id} (intento {intento + 1}), reintentando en {espera}s: {e}")
+                time.sleep(espera)
 
     def get_url(self, public_id: str, transformation: Optional[Dict] = None) -> str:
         """
@@ -206,20 +221,6 @@ class CloudinaryStorage:
             logger.error(f"Error al verificar existencia en Cloudinary: {e}")
             return False
 
-    @staticmethod
-    def _encode_svg(svg_content: str) -> str:
-        """
-        Codifica contenido SVG a base64
-
-        Args:
-            svg_content: Contenido del SVG
-
-        Returns:
-            SVG codificado en base64
-        """
-        import base64
-        return base64.b64encode(svg_content.encode('utf-8')).decode('utf-8')
-
     def get_usage(self) -> Optional[Dict[str, Any]]:
         """
         Obtiene información de uso de Cloudinary
@@ -26,6 +26,16 @@ class Config:
     if DATABASE_URL and DATABASE_URL.startswith('postgres://'):
         DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
 
+    # Pool de conexiones (PostgreSQL)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', -1))  # -1: no reciclar
+    # Detrás de PgBouncer (pooling por transacción) el SELECT 1 de pre-ping deja
+    # conexiones "idle in transaction": desactivado por defecto en ese caso
+    PGBOUNCER = os.getenv('PGBOUNCER', 'False').lower() in ('true', '1') or ':6432' in (DATABASE_URL or '')
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', str(not PGBOUNCER)).lower() == 'true'
+
     # Cloudinary
     CLOUDINARY_CLOUD_NAME = os.getenv('CLOUDINARY_CLOUD_NAME')
     CLOUDINARY_API_KEY = os.getenv('CLOUDINARY_API_KEY')
@@ -52,16 +62,33 @@ class Config:
     # Paths
     CERTIFICATES_DIR = 'certificados'
     TEMPLATE_PATH = 'template.svg'
+    SVG_CACHE_DIR = os.getenv('SVG_CACHE_DIR', os.path.join('cache', 'svg'))
+    PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join('cache', 'pdf'))
+    PREVIEW_CACHE_DIR = os.getenv('PREVIEW_CACHE_DIR', os.path.join('cache', 'preview'))
+
+    # Tamaño máximo (MB) de SVG + PDF + PNG guardados en disco; al superarlo se
+    # eliminan los más antiguos (~1.5MB por certificado). 0 = sin límite
+    LOCAL_CACHE_MAX_MB = int(os.getenv('LOCAL_CACHE_MAX_MB', 2048))
+
+    # Generar el PDF y la vista previa PNG de cada certificado en segundo plano al crearlo
+    PRECALCULAR_PDF = os.getenv('PRECALCULAR_PDF', 'True').lower() == 'true'
+
+    # Procesos del pool de PDFs de CADA worker de gunicorn; cada uno mantiene un
+    # Chromium abierto, así que el total de navegadores es workers x PDF_WORKERS
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', 1))
 
     # Rate Limiting
     RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'True').lower() == 'true'
     RATELIMIT_DEFAULT = os.getenv('RATELIMIT_DEFAULT', '100 per hour')
+    # sliding-window-counter: preciso ante ráfagas en el borde de la ventana y
+    # atómico en Redis (un script Lua por verificación)
+    RATELIMIT_STRATEGY = os.getenv('RATELIMIT_STRATEGY', 'sliding-window-counter')
 
     # Security
     ADMIN_ALLOWED_IPS = os.getenv('ADMIN_ALLOWED_IPS', '').split(',') if os.getenv('ADMIN_ALLOWED_IPS') else []
     # En desarrollo, permitir localhost
     if not ADMIN_ALLOWED_IPS and DEBUG:
-        ADMIN_ALLOWED_IPS = ['127.0.0.1', 'localhost']
+        ADMIN_ALLOWED_IPS = ['127.0.0.1', '::1']  # localhost (IPv4 e IPv6)
 
     @classmethod
     def validate(cls):
@@ -1,13 +1,97 @@
 """
 Servicio de envío de emails con SendGrid
 """
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content
+import requests
+from requests.adapters import HTTPAdapter
+import html
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Dict, Any, List
 import logging
 
 logger = logging.getLogger(__name__)
 
+# HTML del email (plantilla de str.format con las llaves del CSS duplicadas)
+HTML_EMAIL = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        body {{
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            max-width: 600px;
+            margin: 0 auto;
+            padding: 20px;
+        }}
+        .container {{
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            padding: 40px 20px;
+            border-radius: 10px;
+            text-align: center;
+            color: white;
+        }}
+        .content {{
+            background: white;
+            padding: 30px;
+            border-radius: 10px;
+            margin-top: 20px;
+            color: #333;
+        }}
+        .button {{
+            display: inline-block;
+            padding: 15px 40px;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+            text-decoration: none;
+            border-radius: 5px;
+            margin: 20px 0;
+            font-weight: bold;
+        }}
+        .footer {{
+            margin-top: 30px;
+            font-size: 12px;
+            color: #666;
+            text-align: center;
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>¡Felicitaciones, {nombre}!</h1>
+        <p>Tu certificado está listo</p>
+    </div>
+
+    <div class="content">
+        <p>Hola <strong>{nombre}</strong>,</p>
+
+        <p>Nos complace informarte que tu certificado ha sido generado exitosamente.</p>
+
+        <p>Puedes ver y descargar tu certificado haciendo clic en el siguiente botón:</p>
+
+        <a href="{certificado_url}" class="button">Ver mi certificado</a>
+
+        <p>O copia y pega este enlace en tu navegador:</p>
+        <p style="word-break: break-all; color: #667eea;">{certificado_url}</p>
+
+        <p>Este certificado es permanente y podrás acceder a él en cualquier momento.</p>
+    </div>
+
+    <div class="footer">
+        <p>Este es un email automático, por favor no respondas a este mensaje.</p>
+    </div>
+</body>
+</html>
+"""
+
+# Endpoint de envío de la API v3 de SendGrid
+SENDGRID_SEND_URL = 'https://api.sendgrid.com/v3/mail/send'
+
+# Envíos simultáneos a SendGrid durante un batch (cada envío es un POST HTTPS bloqueante)
+ENVIO_WORKERS = 16
+
 
 class EmailService:
     """Servicio para enviar emails a participantes"""
@@ -29,10 +113,15 @@ class EmailService:
         self.configured = bool(api_key and api_key != 'your_sendgrid_api_key')
 
         if self.configured:
-            self.client = SendGridAPIClient(api_key)
+            # Sesión HTTP propia: el cliente de SendGrid usa urllib sin keep-alive
+            # (una conexión TCP + TLS nueva por email); aquí cada hilo del batch
+            # reutiliza una conexión del pool
+            self.http = requests.Session()
+            self.http.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=ENVIO_WORKERS))
+            self.http.headers.update({'Authorization': f'Bearer {api_key}'})
             logger.info("SendGrid configurado correctamente")
         else:
-            self.client = None
+            self.http = None
             logger.warning("SendGrid no está configurado")
 
     def enviar_certificado(
@@ -58,6 +147,9 @@ class EmailService:
             logger.error("No se puede enviar email: SendGrid no configurado")
             return False
 
+        # Import diferido: los helpers de sendgrid tardan ~50 ms en importarse
+        from sendgrid.helpers.mail import Mail, Email, To, Content
+
         try:
             # URL del certificado
             certificado_url = f"{self.app_url}/certificado/{slug}"
@@ -78,7 +170,7 @@ class EmailService:
             )
 
             # Enviar
-            response = self.client.send(message)
+            response = self.http.post(SENDGRID_SEND_URL, json=message.get(), timeout=10)
 
             if response.status_code in [200, 201, 202]:
                 logger.info(f"Email enviado exitosamente a {email}")
@@ -115,54 +207,58 @@ class EmailService:
                 'error': 'SendGrid no configurado'
             }
 
-        exitosos = 0
-        errores = 0
-        resultados = []
+        resultados: List[Optional[Dict[str, Any]]] = [None] * len(certificados)
 
         logger.info(f"Iniciando envío batch de {len(certificados)} emails")
 
-        for i, cert in enumerate(certificados, 1):
-            email = cert.get('email')
-            nombre = cert.get('nombre')
-            slug = cert.get('slug')
-
-            if not email or not nombre or not slug:
-                errores += 1
-                resultados.append({
-                    'email': email,
-                    'success': False,
-                    'error': 'Datos incompletos'
-                })
-                continue
-
-            try:
-                success = self.enviar_certificado(email, nombre, slug, asunto)
-                if success:
-                    exitosos += 1
-                    resultados.append({
+        # Envíos en paralelo (I/O de red); los resultados conservan el orden de entrada
+        with ThreadPoolExecutor(max_workers=ENVIO_WORKERS) as executor:
+            futures = {}
+            for i, cert in enumerate(certificados):
+                email = cert.get('email')
+                nombre = cert.get('nombre')
+                slug = cert.get('slug')
+
+                if not email or not nombre or not slug:
+                    resultados[i] = {
                         'email': email,
-                        'success': True
-                    })
-                else:
-                    errores += 1
-                    resultados.append({
+                        'success': False,
+                        'error': 'Datos incompletos'
+                    }
+                    continue
+
+                futures[executor.submit(self.enviar_certificado, email, nombre, slug, asunto)] = i
+
+            for procesados, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                email = certificados[i].get('email')
+
+                try:
+                    if future.result():
+                        resultados[i] = {
+                            'email': email,
+                            'success': True
+                        }
+                    else:
+                        resultados[i] = {
+                            'email': email,
+                            'success': False,
+                            'error': 'Error al enviar'
+                        }
+                except Exception as e:
+                    logger.error(f"Error al enviar email a {email}: {e}")
+                    resultados[i] = {
                         'email': email,
                         'success': False,
-                        'error': 'Error al enviar'
-                    })
+                        'error': str(e)
+                    }
 
                 # Log progreso cada 50 emails
-                if i % 50 == 0:
-                    logger.info(f"Progreso: {i}/{len(certificados)} emails enviados")
-
-            except Exception as e:
-                errores += 1
-                logger.error(f"Error al enviar email a {email}: {e}")
-                resultados.append({
-                    'email': email,
-                    'success': False,
-                    'error': str(e)
-                })
+                if procesados % 50 == 0:
+                    logger.info(f"Progreso: {procesados}/{len(futures)} emails enviados")
+
+        exitosos = sum(1 for resultado in resultados if resultado['success'])
+        errores = len(resultados) - exitosos
 
         logger.info(f"Batch completado: {exitosos} exitosos, {errores} errores")
 
@@ -184,77 +280,7 @@ class EmailService:
         Returns:
             HTML del email
         """
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <style>
-                body {{
-                    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    max-width: 600px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }}
-                .container {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    padding: 40px 20px;
-                    border-radius: 10px;
-                    text-align: center;
-                    color: white;
-                }}
-                .content {{
-                    background: white;
-                    padding: 30px;
-                    border-radius: 10px;
-                    margin-top: 20px;
-                    color: #333;
-                }}
-                .button {{
-                    display: inline-block;
-                    padding: 15px 40px;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    text-decoration: none;
-                    border-radius: 5px;
-                    margin: 20px 0;
-                    font-weight: bold;
-                }}
-                .footer {{
-                    margin-top: 30px;
-                    font-size: 12px;
-                    color: #666;
-                    text-align: center;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>¡Felicitaciones, {nombre}!</h1>
-                <p>Tu certificado está listo</p>
-            </div>
-
-            <div class="content">
-                <p>Hola <strong>{nombre}</strong>,</p>
-
-                <p>Nos complace informarte que tu certificado ha sido generado exitosamente.</p>
-
-                <p>Puedes ver y descargar tu certificado haciendo clic en el siguiente botón:</p>
-
-                <a href="{certificado_url}" class="button">Ver mi certificado</a>
-
-                <p>O copia y pega este enlace en tu navegador:</p>
-                <p style="word-break: break-all; color: #667eea;">{certificado_url}</p>
-
-                <p>Este certificado es permanente y podrás acceder a él en cualquier momento.</p>
-            </div>
-
-            <div class="footer">
-                <p>Este es un email automático, por favor no respondas a este mensaje.</p>
-            </div>
-        </body>
-        </html>
-        """
+        return HTML_EMAIL.format(
+            nombre=html.escape(nombre),
+            certificado_url=html.escape(certificado_url)
+        )
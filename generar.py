@@ -5,7 +5,7 @@ Script simple para generar certificados sin necesidad de levantar el servidor
 
 from generator import CertificateGenerator
 from database import Database
-import json
+import orjson
 import sys
 
 
@@ -15,16 +15,15 @@ def main():
 
     # Configuración
     template_path = 'template.svg'
-    output_dir = 'certificados'
     data_file = 'participantes.json'
     db_path = 'certificados.db'
 
     # Inicializar base de datos
-    db = Database(db_path)
+    db = Database(f'sqlite:///{db_path}')
 
     # Inicializar generador con base de datos
     try:
-        generator = CertificateGenerator(template_path, output_dir, database=db)
+        generator = CertificateGenerator(template_path, database=db)
     except FileNotFoundError as e:
         print(f'❌ Error: {e}')
         print('Asegúrate de que existe el archivo template.svg')
@@ -32,12 +31,12 @@ def main():
 
     # Leer archivo de participantes
     try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(data_file, 'rb') as f:
+            data = orjson.loads(f.read())
     except FileNotFoundError:
         print(f'❌ Error: No se encontró el archivo {data_file}')
         sys.exit(1)
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f'❌ Error al leer JSON: {e}')
         sys.exit(1)
 
@@ -49,36 +48,27 @@ def main():
 
     print(f'\n📋 Total de participantes: {len(participantes)}\n')
 
-    # Generar certificados
-    exitosos = 0
-    errores = 0
+    # Generar certificados (generar_batch reserva cada slug en BD y guarda las URLs en bloque)
+    batch = generator.generar_batch(participantes)
 
-    for i, participante in enumerate(participantes, 1):
-        nombre = participante.get('nombre')
-        email = participante.get('email')
-
-        if not nombre or not email:
+    for i, resultado in enumerate(batch['resultados'], 1):
+        if resultado.get('success'):
+            print(f'✅ {i}. {resultado["nombre"]} ({resultado["email"]})')
+            print(f'   Slug: {resultado["slug"]}')
+            print(f'   URL: {resultado["url"]}\n')
+        elif 'participante' in resultado:
             print(f'⚠️  Participante {i}: Datos incompletos')
-            errores += 1
-            continue
+        else:
+            print(f'❌ {i}. Error con {resultado["nombre"]}: {resultado["error"]}\n')
 
-        try:
-            resultado = generator.generar_certificado(nombre, email)
-            print(f'✅ {i}. {nombre} ({email})')
-            print(f'   Slug: {resultado["slug"]}')
-            print(f'   URL: {resultado["url"]}')
-            print(f'   Archivo: {resultado["archivo_svg"]}\n')
-            exitosos += 1
-        except Exception as e:
-            print(f'❌ {i}. Error con {nombre}: {e}\n')
-            errores += 1
+    exitosos = batch['exitosos']
+    errores = batch['errores']
 
     # Resumen
     print('=' * 50)
     print('📊 Resumen:')
     print(f'   ✅ Exitosos: {exitosos}')
     print(f'   ❌ Errores: {errores}')
-    print(f'   📁 Directorio: {output_dir}/')
     print(f'   💾 Base de datos: {db_path}')
     print(f'   🎓 Total en BD: {db.contar_certificados()}')
     print('=' * 50)
@@ -1,15 +1,92 @@
 """
 Generador de certificados con integración a Cloudinary
 """
+import html
 import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from utils import generar_slug_unico
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from itertools import islice
+from utils import generar_slug_unico, nombre_to_slug
+from config import config
+from typing import Optional, Dict, Any, Iterator, List, Set, Tuple, Union
 import logging
+import orjson
 from text_to_path import convert_svg_text_to_paths
+from pdf_generator import precalcular_pdf
+import local_storage
 
 logger = logging.getLogger(__name__)
 
+# Fuente usada para convertir el nombre a paths
+FONT_PATH = os.path.join(os.path.dirname(__file__), 'fonts', 'Montserrat-ExtraBold.ttf')
+
+# Certificados subidos acumulados antes de cada UPDATE en bloque (URL de Cloudinary) durante un batch
+LOTE_GUARDADO = 500
+
+# Intentos de reservar un slug libre (otra generación simultánea puede ganarlo antes)
+INTENTOS_RESERVA = 5
+
+# Subidas simultáneas a Cloudinary durante un batch (acota también el uso de su API)
+UPLOAD_WORKERS = 8
+
+# Subidas encoladas como máximo en el pool de hilos (en curso + esperando), cada una con su SVG
+SUBIDAS_EN_ESPERA = 2 * UPLOAD_WORKERS
+
+# Renders encolados a la vez en el pool de procesos durante un batch (cada SVG ocupa
+# lo mismo que el template, ~700 KB, y se retiene hasta que se consume)
+VENTANA_RENDER = 2 * (os.cpu_count() or 1)
+
+# Pool de procesos para el renderizado SVG (CPU-bound), creado en el primer batch
+_render_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_render_executor() -> ProcessPoolExecutor:
+    """Obtiene el pool de procesos compartido para renderizar certificados"""
+    global _render_executor
+    if _render_executor is None:
+        _render_executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _render_executor
+
+
+@lru_cache(maxsize=4)
+def _leer_template(template_path: str, mtime: float) -> List[bytes]:
+    """
+    Lee el template SVG (cacheado por ruta y fecha de modificación)
+
+    Returns:
+        Fragmentos del template (bytes UTF-8) separados por el placeholder {{NOMBRE}}
+    """
+    with open(template_path, 'rb') as f:
+        return f.read().split(b'{{NOMBRE}}')
+
+
+def renderizar_svg(template_path: str, nombre: str, font_path: str = FONT_PATH) -> str:
+    """
+    Renderiza el SVG personalizado de un certificado
+
+    Función de módulo (sin estado) para poder ejecutarse en otro proceso.
+
+    Args:
+        template_path: Ruta al archivo SVG template
+        nombre: Nombre de la persona
+        font_path: Ruta a la fuente usada para convertir texto a paths
+
+    Returns:
+        SVG con el nombre reemplazado y el texto convertido a paths
+    """
+    # Template SVG leído y partido una sola vez por proceso (se relee si cambia en disco)
+    partes = _leer_template(template_path, os.path.getmtime(template_path))
+
+    # Insertar el nombre escapado (un "&" o "<" en el nombre dejaría el SVG mal formado).
+    # Se arma directamente en bytes, que es lo que consume el parser XML
+    svg_personalizado = html.escape(nombre).encode('utf-8').join(partes)
+
+    # Convertir texto a paths para garantizar visualización consistente
+    return convert_svg_text_to_paths(svg_personalizado, font_path)
+
 
 class CertificateGenerator:
     def __init__(
@@ -40,38 +117,35 @@ class CertificateGenerator:
         if not cloudinary_storage:
             logger.warning("Generador inicializado sin Cloudinary")
 
-    def generar_certificado(self, nombre: str, email: str) -> Dict[str, Any]:
+    def generar_certificado(
+        self,
+        nombre: str,
+        email: str,
+        svg_personalizado: Optional[str] = None,
+        slug: Optional[str] = None,
+        guardar: bool = True
+    ) -> Dict[str, Any]:
         """
         Genera un certificado personalizado para una persona
 
         Args:
             nombre: Nombre de la persona
             email: Email de la persona
+            svg_personalizado: SVG ya renderizado (opcional, ver generar_batch)
+            slug: Slug ya reservado en BD (opcional, ver generar_batch)
+            guardar: Si es False no se guarda la URL en BD (generar_batch
+                     completa las filas luego con un UPDATE en bloque)
 
         Returns:
             dict con información del certificado generado
         """
         try:
-            # Leer template SVG
-            with open(self.template_path, 'r', encoding='utf-8') as f:
-                svg_content = f.read()
-
-            # Reemplazar el placeholder del nombre
-            svg_personalizado = svg_content.replace('{{NOMBRE}}', nombre)
-
-            # Convertir texto a paths para garantizar visualización consistente
-            font_path = os.path.join(os.path.dirname(__file__), 'fonts', 'Montserrat-ExtraBold.ttf')
-            svg_personalizado = convert_svg_text_to_paths(
-                svg_personalizado,
-                font_path
-            )
+            if svg_personalizado is None:
+                svg_personalizado = renderizar_svg(self.template_path, nombre)
 
-            # Generar slug único para este certificado (ej: "frank-vargas")
-            if self.database:
-                slug = generar_slug_unico(nombre, self.database)
-            else:
-                from utils import nombre_to_slug
-                slug = nombre_to_slug(nombre)
+            # Reservar el slug único de este certificado (ej: "frank-vargas") antes de subirlo
+            if slug is None:
+                slug = self._reservar_slug(nombre, email)
 
             # Subir a Cloudinary
             cloudinary_url = None
@@ -83,6 +157,11 @@ class CertificateGenerator:
                     cloudinary_url = upload_result['url']
                     cloudinary_public_id = upload_result['public_id']
                     logger.info(f"Certificado subido a Cloudinary: {slug}")
+
+                    # Copia local para servir el certificado sin volver a Cloudinary
+                    # (el precálculo del PDF la relee desde disco)
+                    if local_storage.guardar_svg(slug, svg_personalizado) and config.PRECALCULAR_PDF:
+                        precalcular_pdf(slug)
                 else:
                     logger.error(f"Error al subir certificado a Cloudinary: {slug}")
                     raise Exception("Error al subir certificado a Cloudinary")
@@ -90,15 +169,14 @@ class CertificateGenerator:
                 logger.error("Cloudinary no está configurado")
                 raise Exception("Cloudinary no está configurado")
 
-            # Guardar en base de datos
-            if self.database:
-                self.database.guardar_certificado(
-                    slug=slug,
-                    nombre=nombre,
-                    email=email,
-                    cloudinary_url=cloudinary_url,
-                    cloudinary_public_id=cloudinary_public_id
-                )
+            # Guardar la URL en la fila reservada
+            if self.database and guardar:
+                if not self.database.completar_certificados([{
+                    'slug': slug,
+                    'cloudinary_url': cloudinary_url,
+                    'cloudinary_public_id': cloudinary_public_id
+                }]):
+                    raise Exception("Error al guardar certificado en BD")
                 logger.info(f"Certificado guardado en BD: {slug}")
 
             return {
@@ -113,6 +191,8 @@ class CertificateGenerator:
 
         except Exception as e:
             logger.error(f"Error al generar certificado para {nombre}: {e}")
+            if slug and self.database:
+                self.database.liberar_slug(slug)
             return {
                 'nombre': nombre,
                 'email': email,
@@ -125,51 +205,94 @@ class CertificateGenerator:
         Genera certificados en batch para múltiples participantes
 
         Args:
-            participantes: Lista de diccionarios con 'nombre' y 'email'
+            participantes: Lista de diccionarios u objetos (ParticipanteStruct,
+                           ParticipanteSchema) con 'nombre' y 'email'
 
         Returns:
             dict con resumen y resultados
         """
-        resultados = []
-        exitosos = 0
-        errores = 0
-
         logger.info(f"Iniciando generación batch de {len(participantes)} certificados")
 
-        for i, participante in enumerate(participantes, 1):
-            nombre = participante.get('nombre')
-            email = participante.get('email')
-
-            if not nombre or not email:
-                errores += 1
-                resultados.append({
-                    'error': 'Participante sin nombre o email',
-                    'participante': participante,
-                    'success': False
-                })
-                continue
-
-            try:
-                resultado = self.generar_certificado(nombre, email)
-                if resultado.get('success'):
-                    exitosos += 1
+        # Extraer nombre/email de cada participante
+        entradas = []
+        for participante in participantes:
+            if isinstance(participante, dict):
+                nombre = participante.get('nombre')
+                email = participante.get('email')
+            else:
+                # Structs/modelos construidos sin validar pueden no tener los campos
+                nombre = getattr(participante, 'nombre', None)
+                email = getattr(participante, 'email', None)
+            entradas.append((participante, nombre, email))
+
+        # Renderizar en paralelo los SVG de los participantes válidos; cada SVG se
+        # sube en cuanto está listo, mientras el pool sigue renderizando los siguientes.
+        # Las dos etapas están acotadas (VENTANA_RENDER renders y SUBIDAS_EN_ESPERA
+        # subidas), así un batch grande no acumula en memoria todos sus SVG
+        svgs = iter(self._renderizar_batch([
+            nombre for _, nombre, email in entradas if nombre and email
+        ]))
+
+        resultados: List[Optional[Dict[str, Any]]] = [None] * len(entradas)
+
+        # Filas subidas pendientes de guardar su URL (UPDATE en bloque) y slugs reservados en el batch
+        pendientes: List[Tuple[int, Dict[str, Any]]] = []
+        slugs_reservados = set()
+
+        # Subidas a Cloudinary en paralelo (I/O); los slugs se reservan antes, en serie,
+        # insertando su fila: ni otro hilo ni otra generación simultánea puede subir el mismo slug
+        procesados = 0
+        total_subidas = sum(1 for _, nombre, email in entradas if nombre and email)
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            futures = {}
+            for i, (participante, nombre, email) in enumerate(entradas):
+                if not nombre or not email:
+                    resultados[i] = {
+                        'error': 'Participante sin nombre o email',
+                        'participante': participante if isinstance(participante, dict) else {'nombre': nombre, 'email': email},
+                        'success': False
+                    }
+                    continue
+
+                # Recoger las subidas ya terminadas para no retener sus futures hasta el final.
+                # Con la cola de subidas llena, esperar a que termine alguna ANTES de tomar el
+                # siguiente SVG: mientras tanto los renders esperan en la ventana del pool
+                if len(futures) >= SUBIDAS_EN_ESPERA:
+                    terminadas, _ = wait(futures, return_when=FIRST_COMPLETED)
                 else:
-                    errores += 1
-                resultados.append(resultado)
+                    terminadas = [future for future in futures if future.done()]
+                procesados = self._recoger_subidas(
+                    terminadas, futures, resultados, pendientes, procesados, total_subidas
+                )
 
-                # Log progreso cada 50 certificados
-                if i % 50 == 0:
-                    logger.info(f"Progreso: {i}/{len(participantes)} certificados procesados")
+                try:
+                    svg_personalizado = next(svgs)
+                    if isinstance(svg_personalizado, Exception):
+                        raise svg_personalizado
+
+                    slug = self._reservar_slug(nombre, email, slugs_reservados)
+                    future = executor.submit(
+                        self.generar_certificado, nombre, email, svg_personalizado, slug, False
+                    )
+                    futures[future] = i
+
+                except Exception as e:
+                    logger.error(f"Error al procesar participante {nombre}: {e}")
+                    resultados[i] = {
+                        'nombre': nombre,
+                        'email': email,
+                        'error': str(e),
+                        'success': False
+                    }
+
+            self._recoger_subidas(
+                list(as_completed(futures)), futures, resultados, pendientes, procesados, total_subidas
+            )
 
-            except Exception as e:
-                errores += 1
-                logger.error(f"Error al procesar participante {nombre}: {e}")
-                resultados.append({
-                    'nombre': nombre,
-                    'email': email,
-                    'error': str(e),
-                    'success': False
-                })
+        self._guardar_pendientes(pendientes, resultados)
+
+        exitosos = sum(1 for resultado in resultados if resultado.get('success'))
+        errores = len(resultados) - exitosos
 
         logger.info(f"Batch completado: {exitosos} exitosos, {errores} errores")
 
@@ -180,6 +303,153 @@ class CertificateGenerator:
             'resultados': resultados
         }
 
+    def _recoger_subidas(
+        self,
+        terminadas: List[Future],
+        futures: Dict[Future, int],
+        resultados: List[Optional[Dict[str, Any]]],
+        pendientes: List[Tuple[int, Dict[str, Any]]],
+        procesados: int,
+        total: int
+    ) -> int:
+        """
+        Guarda el resultado de las subidas terminadas y las quita de futures
+
+        Args:
+            terminadas: Futures de subidas ya terminadas
+            futures: Subidas en curso (future -> índice del participante)
+            resultados: Resultados del batch, por índice de participante
+            pendientes: Filas (índice, fila) pendientes del UPDATE en bloque
+            procesados: Subidas recogidas hasta ahora
+            total: Subidas del batch (para el log de progreso)
+
+        Returns:
+            Subidas recogidas tras esta llamada
+        """
+        for future in terminadas:
+            resultado = future.result()
+            indice = futures.pop(future)
+            resultados[indice] = resultado
+
+            if resultado.get('success'):
+                pendientes.append((indice, {
+                    'slug': resultado['slug'],
+                    'cloudinary_url': resultado['cloudinary_url'],
+                    'cloudinary_public_id': resultado['cloudinary_public_id']
+                }))
+                if len(pendientes) >= LOTE_GUARDADO:
+                    self._guardar_pendientes(pendientes, resultados)
+
+            # Log progreso cada 50 certificados
+            procesados += 1
+            if procesados % 50 == 0:
+                logger.info(f"Progreso: {procesados}/{total} certificados procesados")
+
+        return procesados
+
+    def _reservar_slug(self, nombre: str, email: str, reservados: Optional[Set[str]] = None) -> str:
+        """
+        Genera el slug único de un nombre (ej: "frank-vargas") y lo reserva en BD
+
+        Args:
+            nombre: Nombre de la persona
+            email: Email de la persona
+            reservados: Slugs ya reservados en el batch en curso (se agrega el nuevo)
+
+        Returns:
+            Slug reservado
+        """
+        if not self.database:
+            return nombre_to_slug(nombre)
+
+        if reservados is None:
+            reservados = set()
+
+        for _ in range(INTENTOS_RESERVA):
+            # Un slug que no se pudo reservar queda en reservados y no se vuelve a probar
+            slug = generar_slug_unico(nombre, self.database, reservados)
+            if self.database.reservar_slug(slug, nombre, email):
+                return slug
+
+        raise Exception(f"No se pudo reservar un slug para {nombre}")
+
+    def _guardar_pendientes(
+        self,
+        pendientes: List[Tuple[int, Dict[str, Any]]],
+        resultados: List[Optional[Dict[str, Any]]]
+    ):
+        """
+        Guarda en BD la URL de las filas pendientes con un único UPDATE y vacía la lista
+
+        Si el UPDATE falla, los participantes de esas filas se marcan como fallidos
+        (y se liberan sus slugs) en lugar de darlos por generados.
+        """
+        if pendientes and self.database:
+            if not self.database.completar_certificados([fila for _, fila in pendientes]):
+                for indice, fila in pendientes:
+                    resultado = resultados[indice]
+                    self.database.liberar_slug(fila['slug'])
+                    resultados[indice] = {
+                        'nombre': resultado['nombre'],
+                        'email': resultado['email'],
+                        'error': 'Error al guardar certificado en BD',
+                        'success': False
+                    }
+        pendientes.clear()
+
+    def _renderizar_batch(self, nombres: List[str]) -> Iterator[Union[str, Exception]]:
+        """
+        Renderiza los SVG de varios nombres usando el pool de procesos
+
+        Como mucho VENTANA_RENDER renders están encolados a la vez: cada vez que
+        se entrega un resultado se encola el siguiente nombre, así el batch no
+        retiene en memoria todos los SVG que aún no se han consumido.
+
+        Args:
+            nombres: Lista de nombres a renderizar
+
+        Yields:
+            El SVG o la excepción de cada nombre (en el mismo orden)
+        """
+        if len(nombres) <= 1:
+            yield from (self._renderizar_seguro(nombre) for nombre in nombres)
+            return
+
+        executor = _get_render_executor()
+        restantes = iter(nombres)
+        en_curso = deque(
+            self._encolar_render(executor, nombre) for nombre in islice(restantes, VENTANA_RENDER)
+        )
+
+        while en_curso:
+            future = en_curso.popleft()
+
+            # Reponer la ventana antes de esperar, para que el pool no se quede sin trabajo
+            for nombre in islice(restantes, 1):
+                en_curso.append(self._encolar_render(executor, nombre))
+
+            try:
+                yield future.result()
+            except Exception as e:
+                yield e
+
+    def _encolar_render(self, executor: ProcessPoolExecutor, nombre: str) -> Future:
+        """Encola el render de un nombre en el pool (o lo hace en serie si el pool no está disponible)"""
+        try:
+            return executor.submit(renderizar_svg, self.template_path, nombre)
+        except (BrokenProcessPool, RuntimeError) as e:
+            logger.warning(f"Pool de procesos no disponible, renderizando en serie: {e}")
+            future = Future()
+            future.set_result(self._renderizar_seguro(nombre))
+            return future
+
+    def _renderizar_seguro(self, nombre: str) -> Union[str, Exception]:
+        """Renderiza un SVG en el proceso actual devolviendo la excepción si falla"""
+        try:
+            return renderizar_svg(self.template_path, nombre)
+        except Exception as e:
+            return e
+
     def generar_desde_archivo(self, archivo_json: str) -> Dict[str, Any]:
         """
         Genera certificados desde un archivo JSON
@@ -190,11 +460,9 @@ class CertificateGenerator:
         Returns:
             dict con resultados del batch
         """
-        import json
-
         try:
-            with open(archivo_json, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(archivo_json, 'rb') as f:
+                data = orjson.loads(f.read())
 
             participantes = data.get('participantes', [])
             return self.generar_batch(participantes)
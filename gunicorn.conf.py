@@ -0,0 +1,26 @@
+"""
+Configuración de gunicorn para producción
+Workers gevent: el I/O bloqueante (BD, Cloudinary, Redis) se solapa entre requests
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Cada worker crea además, en el primer uso, su propio pool de PDFs (PDF_WORKERS
+# procesos, cada uno con un Chromium abierto, ~150-300MB) y en los batch un pool de
+# render de cpu_count procesos. Con el valor por defecto hay (2 x CPU + 1) x PDF_WORKERS
+# navegadores por host: dimensionar WEB_CONCURRENCY según la RAM disponible
+workers = int(os.getenv('WEB_CONCURRENCY', 2 * (os.cpu_count() or 1) + 1))
+worker_class = 'gevent'
+worker_connections = 1000
+keepalive = 5
+timeout = 120
+
+# Sin preload: el worker gevent aplica el monkey-patching al arrancar, después del
+# fork. Con preload, los módulos se importarían antes y sus locks y colas (CacheLocal,
+# LimitadorLocal, cola de precálculo de PDFs) serían primitivas de hilos reales que
+# bloquean el worker entero en lugar de ceder a otros greenlets
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,238 @@
+"""
+Almacenamiento local (en disco) de los SVG generados (comprimidos con gzip)
+y de sus PDFs y vistas previas PNG ya renderizados.
+Evita descargar de Cloudinary el SVG que este mismo servicio generó y volver
+a renderizar el PDF en cada vista. Si el archivo no existe (otra réplica,
+disco efímero) se usa Cloudinary / se renderiza de nuevo.
+
+El tamaño total en disco se acota con config.LOCAL_CACHE_MAX_MB: al superarlo
+se eliminan los archivos más antiguos.
+"""
+import gzip
+import os
+import tempfile
+import threading
+import logging
+from typing import Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Escrituras entre cada revisión del tamaño total (recorrer los directorios no es gratis)
+ESCRITURAS_POR_REVISION = 100
+
+# Al limpiar se baja hasta esta fracción del máximo, para no limpiar en cada revisión
+FRACCION_TRAS_LIMPIEZA = 0.9
+
+_escrituras = 0
+_escrituras_lock = threading.Lock()
+
+
+def _ruta_svg(slug: str) -> str:
+    return os.path.join(config.SVG_CACHE_DIR, f'{slug}.svg.gz')
+
+
+def guardar_svg(slug: str, svg_content: str) -> bool:
+    """
+    Guarda el SVG de un certificado en disco (escritura atómica)
+
+    Args:
+        slug: Slug del certificado
+        svg_content: Contenido del SVG
+
+    Returns:
+        True si se guardó correctamente
+    """
+    try:
+        os.makedirs(config.SVG_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=config.SVG_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(gzip.compress(svg_content.encode('utf-8'), compresslevel=6))
+        os.replace(tmp_path, _ruta_svg(slug))
+        _registrar_escritura()
+        return True
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el SVG local de {slug}: {e}")
+        return False
+
+
+def ruta_svg_gz(slug: str) -> Optional[str]:
+    """
+    Obtiene la ruta del SVG comprimido (gzip) guardado de un certificado
+
+    Args:
+        slug: Slug del certificado
+
+    Returns:
+        Ruta del .svg.gz o None si no está guardado localmente
+    """
+    ruta = _ruta_svg(slug)
+    return ruta if os.path.exists(ruta) else None
+
+
+def leer_svg(slug: str) -> Optional[str]:
+    """
+    Lee el SVG de un certificado desde disco
+
+    Args:
+        slug: Slug del certificado
+
+    Returns:
+        Contenido del SVG o None si no está guardado localmente
+    """
+    try:
+        with open(_ruta_svg(slug), 'rb') as f:
+            return gzip.decompress(f.read()).decode('utf-8')
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"No se pudo leer el SVG local de {slug}: {e}")
+        return None
+
+
+def _ruta_pdf(slug: str) -> str:
+    return os.path.join(config.PDF_CACHE_DIR, f'{slug}.pdf')
+
+
+def ruta_pdf(slug: str) -> Optional[str]:
+    """
+    Obtiene la ruta del PDF guardado de un certificado
+
+    Args:
+        slug: Slug del certificado
+
+    Returns:
+        Ruta del PDF o None si no está guardado localmente
+    """
+    ruta = _ruta_pdf(slug)
+    return ruta if os.path.exists(ruta) else None
+
+
+def guardar_pdf(slug: str, pdf_bytes: bytes) -> bool:
+    """
+    Guarda el PDF de un certificado en disco (escritura atómica)
+
+    Args:
+        slug: Slug del certificado
+        pdf_bytes: Contenido del PDF generado
+
+    Returns:
+        True si se guardó correctamente
+    """
+    try:
+        os.makedirs(config.PDF_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=config.PDF_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, _ruta_pdf(slug))
+        _registrar_escritura()
+        return True
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el PDF local de {slug}: {e}")
+        return False
+
+
+def _ruta_preview(slug: str) -> str:
+    return os.path.join(config.PREVIEW_CACHE_DIR, f'{slug}.png')
+
+
+def ruta_preview(slug: str) -> Optional[str]:
+    """
+    Obtiene la ruta de la vista previa PNG guardada de un certificado
+
+    Args:
+        slug: Slug del certificado
+
+    Returns:
+        Ruta del PNG o None si no está guardado localmente
+    """
+    ruta = _ruta_preview(slug)
+    return ruta if os.path.exists(ruta) else None
+
+
+def guardar_preview(slug: str, png_bytes: bytes) -> bool:
+    """
+    Guarda la vista previa PNG de un certificado en disco (escritura atómica)
+
+    Args:
+        slug: Slug del certificado
+        png_bytes: Contenido del PNG generado
+
+    Returns:
+        True si se guardó correctamente
+    """
+    try:
+        os.makedirs(config.PREVIEW_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=config.PREVIEW_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(png_bytes)
+        os.replace(tmp_path, _ruta_preview(slug))
+        _registrar_escritura()
+        return True
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la vista previa local de {slug}: {e}")
+        return False
+
+
+def _registrar_escritura():
+    """Cuenta una escritura y revisa el tamaño de la caché cada ESCRITURAS_POR_REVISION"""
+    global _escrituras
+    with _escrituras_lock:
+        _escrituras += 1
+        if _escrituras % ESCRITURAS_POR_REVISION:
+            return
+    limpiar_cache()
+
+
+def limpiar_cache(max_bytes: Optional[int] = None) -> int:
+    """
+    Elimina los archivos más antiguos de la caché en disco si supera el máximo
+
+    Args:
+        max_bytes: Tamaño máximo en bytes (por defecto config.LOCAL_CACHE_MAX_MB; 0 = sin límite)
+
+    Returns:
+        Número de archivos eliminados
+    """
+    if max_bytes is None:
+        max_bytes = config.LOCAL_CACHE_MAX_MB * 1024 * 1024
+    if max_bytes <= 0:
+        return 0
+
+    archivos = []
+    total = 0
+    for directorio in {config.SVG_CACHE_DIR, config.PDF_CACHE_DIR, config.PREVIEW_CACHE_DIR}:
+        try:
+            with os.scandir(directorio) as entradas:
+                for entrada in entradas:
+                    # Los .tmp son escrituras en curso
+                    if entrada.name.endswith('.tmp') or not entrada.is_file():
+                        continue
+                    stat = entrada.stat()
+                    archivos.append((stat.st_mtime, stat.st_size, entrada.path))
+                    total += stat.st_size
+        except FileNotFoundError:
+            continue
+
+    if total <= max_bytes:
+        return 0
+
+    objetivo = int(max_bytes * FRACCION_TRAS_LIMPIEZA)
+    eliminados = 0
+    for _, tamano, ruta in sorted(archivos):
+        if total <= objetivo:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            # Ya lo eliminó otro proceso
+            pass
+        except OSError as e:
+            logger.warning(f"No se pudo eliminar {ruta} de la caché local: {e}")
+            continue
+        total -= tamano
+        eliminados += 1
+
+    logger.info(f"Caché local limpiada: {eliminados} archivos eliminados")
+    return eliminados
@@ -3,122 +3,345 @@ Generador de PDF desde SVG usando Playwright
 """
 import tempfile
 import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Set, Tuple
 from playwright.sync_api import sync_playwright
 import logging
 
+from config import config
+import local_storage
+
 logger = logging.getLogger(__name__)
 
+# Tiempo máximo de espera por un PDF generado en el pool
+PDF_TIMEOUT = 30  # segundos
+
+# Cola de precálculo: guarda solo slugs (el SVG se relee del disco local al procesarlo),
+# así que puede ser larga sin retener memoria. Llena, precalcular_pdf espera (backpressure)
+PRECALCULOS_EN_COLA = 10000
+_cola_precalculos: "queue.Queue[str]" = queue.Queue(maxsize=PRECALCULOS_EN_COLA)
+_precalculos_lock = threading.Lock()
+_precalculos_hilo: Optional[threading.Thread] = None
+_precalculos_pendientes: Set[str] = set()
+
+# Tamaño de la vista previa PNG para redes sociales (Open Graph)
+PREVIEW_ANCHO = 1200
+PREVIEW_ALTO = 675
+
+# Pool de procesos para generar PDFs fuera del hilo del request (creado en el primer uso).
+# También acota cuántos navegadores se lanzan a la vez (config.PDF_WORKERS por worker web).
+# Lo comparten los PDFs pedidos por usuarios y el precálculo de los recién generados.
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+_pdf_lock = threading.Lock()
+
+# Argumentos de lanzamiento de Chromium
+CHROMIUM_ARGS = [
+    '--disable-web-security',
+    '--disable-features=IsolateOrigins,site-per-process',
+    '--no-sandbox',
+    '--disable-setuid-sandbox'
+]
+
+# HTML que envuelve el SVG a renderizar ({svg} se sustituye con str.replace)
+HTML_SVG = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+
+        html, body {
+            width: 100%;
+            height: 100%;
+        }
+
+        body {
+            display: flex;
+            justify-content: center;
+            align-items: center;
+            background: white;
+        }
+
+        svg {
+            max-width: 100%;
+            max-height: 100%;
+            width: auto;
+            height: auto;
+        }
+    </style>
+</head>
+<body>
+    {svg}
+</body>
+</html>
+"""
+
+# Navegador persistente de cada proceso del pool (evita lanzar Chromium en cada PDF)
+_es_worker = False
+_playwright = None
+_navegador = None
+
+
+def _iniciar_worker():
+    """Inicializador de los procesos del pool: habilita el navegador persistente"""
+    global _es_worker
+    _es_worker = True
+
+
+def _obtener_navegador():
+    """
+    Obtiene el navegador persistente del proceso (se lanza en el primer uso)
+
+    Solo se usa dentro de los procesos del pool, que ejecutan un render a la vez
+    en su hilo principal. El driver de Playwright termina junto con el proceso.
+    """
+    global _playwright, _navegador
+    if _navegador is None or not _navegador.is_connected():
+        if _playwright is None:
+            _playwright = sync_playwright().start()
+        _navegador = _playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+    return _navegador
+
+
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    """Obtiene el pool de procesos compartido para generar PDFs"""
+    global _pdf_executor
+    # generar_batch precalcula desde varios hilos: crear un único pool
+    with _pdf_lock:
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(max_workers=max(1, config.PDF_WORKERS), initializer=_iniciar_worker)
+        return _pdf_executor
+
+
+def precalcular_pdf(slug: str, esperar: bool = True) -> bool:
+    """
+    Encola la generación en segundo plano del PDF y la vista previa PNG de un certificado
+
+    El SVG debe estar ya guardado en disco (local_storage.guardar_svg). Un slug
+    que ya está en la cola no se vuelve a encolar.
+
+    Args:
+        slug: Slug del certificado
+        esperar: Si la cola está llena, esperar un hueco (True) o no encolar (False,
+                 para no bloquear un request)
+
+    Returns:
+        True si el slug está encolado
+    """
+    global _precalculos_hilo
+    with _precalculos_lock:
+        if slug in _precalculos_pendientes:
+            return True
+        _precalculos_pendientes.add(slug)
+        if _precalculos_hilo is None or not _precalculos_hilo.is_alive():
+            _precalculos_hilo = threading.Thread(target=_procesar_precalculos, name='precalculos', daemon=True)
+            _precalculos_hilo.start()
+
+    try:
+        _cola_precalculos.put(slug, block=esperar)
+        return True
+    except queue.Full:
+        _terminar_precalculo(slug)
+        return False
+
 
-def svg_to_pdf(svg_content: str, output_path: str = None) -> str:
+def esperar_precalculos():
+    """Bloquea hasta que se hayan procesado todos los precálculos encolados"""
+    _cola_precalculos.join()
+
+
+def _terminar_precalculo(slug: str):
+    """Quita un slug de los precálculos pendientes"""
+    with _precalculos_lock:
+        _precalculos_pendientes.discard(slug)
+
+
+def _procesar_precalculos():
+    """
+    Worker que vacía la cola de precálculo en el pool de PDFs
+
+    Como mucho hay config.PDF_WORKERS precálculos a la vez en el pool, así los
+    PDFs pedidos por usuarios nunca esperan detrás de toda la cola.
+    """
+    global _pdf_executor
+    en_curso = threading.BoundedSemaphore(max(1, config.PDF_WORKERS))
+
+    while True:
+        slug = _cola_precalculos.get()
+        svg_content = local_storage.leer_svg(slug)
+        if svg_content is None:
+            logger.warning(f"SVG local no disponible, no se precalcula el PDF de {slug}")
+            _terminar_precalculo(slug)
+            _cola_precalculos.task_done()
+            continue
+
+        def guardar(future, slug=slug):
+            try:
+                pdf_bytes, png_bytes = future.result()
+                local_storage.guardar_pdf(slug, pdf_bytes)
+                local_storage.guardar_preview(slug, png_bytes)
+            except Exception as e:
+                logger.warning(f"No se pudo precalcular el PDF de {slug}: {e}")
+            finally:
+                en_curso.release()
+                _terminar_precalculo(slug)
+                _cola_precalculos.task_done()
+
+        en_curso.acquire()
+        try:
+            _get_pdf_executor().submit(svg_to_pdf_y_preview, svg_content).add_done_callback(guardar)
+        except (BrokenProcessPool, RuntimeError) as e:
+            logger.warning(f"Pool de PDFs no disponible para precalcular {slug}: {e}")
+            _pdf_executor = None
+            en_curso.release()
+            _terminar_precalculo(slug)
+            _cola_precalculos.task_done()
+
+
+def generar_pdf(svg_content: str, timeout: float = PDF_TIMEOUT) -> bytes:
+    """
+    Convierte SVG a PDF en el pool de procesos
+
+    Args:
+        svg_content: Contenido del SVG como string
+        timeout: Segundos máximos de espera
+
+    Returns:
+        Contenido del PDF generado
+    """
+    global _pdf_executor
+    try:
+        future = _get_pdf_executor().submit(svg_to_pdf, svg_content)
+        return future.result(timeout=timeout)
+    except BrokenProcessPool as e:
+        logger.warning(f"Pool de PDFs no disponible, generando en el proceso actual: {e}")
+        _pdf_executor = None
+        return svg_to_pdf(svg_content)
+
+
+def svg_to_pdf(svg_content: str, output_path: str = None) -> bytes:
     """
     Convierte contenido SVG a PDF usando Playwright.
 
     Args:
         svg_content: Contenido del SVG como string
-        output_path: Ruta donde guardar el PDF (opcional)
+        output_path: Ruta donde guardar además el PDF (opcional)
 
     Returns:
-        Ruta del archivo PDF generado
+        Contenido del PDF generado
     """
-    if output_path is None:
-        # Crear archivo temporal para el PDF
-        fd, output_path = tempfile.mkstemp(suffix='.pdf')
-        os.close(fd)
+    pdf_bytes, _ = _renderizar_svg(svg_content, output_path)
+    return pdf_bytes
 
-    # Crear HTML temporal que contiene el SVG
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            * {{
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-            }}
-
-            html, body {{
-                width: 100%;
-                height: 100%;
-            }}
-
-            body {{
-                display: flex;
-                justify-content: center;
-                align-items: center;
-                background: white;
-            }}
-
-            svg {{
-                max-width: 100%;
-                max-height: 100%;
-                width: auto;
-                height: auto;
-            }}
-        </style>
-    </head>
-    <body>
-        {svg_content}
-    </body>
-    </html>
-    """
-
-    # Crear archivo HTML temporal
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as tmp:
-        tmp.write(html_content)
-        html_path = tmp.name
 
-    try:
-        with sync_playwright() as p:
-            # Iniciar navegador
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-web-security',
-                    '--disable-features=IsolateOrigins,site-per-process',
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox'
-                ]
-            )
+def svg_to_pdf_y_preview(
+    svg_content: str,
+    ancho: int = PREVIEW_ANCHO,
+    alto: int = PREVIEW_ALTO
+) -> Tuple[bytes, bytes]:
+    """
+    Genera el PDF y la vista previa PNG (Open Graph) con un solo navegador
 
-            page = browser.new_page()
+    Args:
+        svg_content: Contenido del SVG como string
+        ancho: Ancho del PNG en pixels
+        alto: Alto del PNG en pixels
 
-            # Cargar el HTML con el SVG
-            page.goto(f'file://{html_path}')
+    Returns:
+        Tupla (contenido del PDF, contenido del PNG)
+    """
+    return _renderizar_svg(svg_content, tamano_preview=(ancho, alto))
 
-            # Esperar a que el SVG se cargue completamente
-            page.wait_for_timeout(2000)
 
-            # Generar PDF
-            # Tamaño A4 horizontal (landscape) para certificados
-            page.pdf(
-                path=output_path,
-                format='A4',
-                landscape=True,
-                print_background=True,
-                margin={
-                    'top': '0',
-                    'right': '0',
-                    'bottom': '0',
-                    'left': '0'
-                }
-            )
+def _renderizar_svg(
+    svg_content: str,
+    output_path: str = None,
+    tamano_preview: Optional[Tuple[int, int]] = None
+) -> Tuple[bytes, Optional[bytes]]:
+    """
+    Renderiza el SVG en Chromium y genera el PDF (y opcionalmente un PNG)
 
-            browser.close()
+    Args:
+        svg_content: Contenido del SVG como string
+        output_path: Ruta donde guardar además el PDF (opcional)
+        tamano_preview: (ancho, alto) del PNG de vista previa, o None para no generarlo
 
-        logger.info(f"PDF generado exitosamente: {output_path}")
-        return output_path
+    Returns:
+        Tupla (contenido del PDF, contenido del PNG o None)
+    """
+    # El HTML se carga directamente en la página, sin archivo temporal
+    html_content = HTML_SVG.replace('{svg}', svg_content, 1)
+
+    try:
+        if _es_worker:
+            # Proceso del pool: navegador persistente, un contexto nuevo por render
+            contexto = _obtener_navegador().new_context()
+            try:
+                pdf_bytes, png_bytes = _renderizar_pagina(contexto.new_page(), html_content, output_path, tamano_preview)
+            finally:
+                contexto.close()
+        else:
+            with sync_playwright() as p:
+                # Iniciar navegador
+                browser = p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+                try:
+                    pdf_bytes, png_bytes = _renderizar_pagina(browser.new_page(), html_content, output_path, tamano_preview)
+                finally:
+                    browser.close()
+
+        logger.info(f"PDF generado exitosamente ({len(pdf_bytes)} bytes)")
+        return pdf_bytes, png_bytes
 
     except Exception as e:
         logger.error(f"Error al generar PDF: {e}")
         raise
-    finally:
-        # Limpiar archivo HTML temporal
-        try:
-            os.unlink(html_path)
-        except:
-            pass
+
+
+def _renderizar_pagina(
+    page,
+    html_content: str,
+    output_path: Optional[str],
+    tamano_preview: Optional[Tuple[int, int]]
+) -> Tuple[bytes, Optional[bytes]]:
+    """Carga el HTML en la página y genera el PDF (y el PNG si se pidió)"""
+    # Cargar el HTML con el SVG: set_content espera al evento load, que incluye
+    # las imágenes embebidas (data URI) del template
+    page.set_content(html_content, wait_until='load')
+
+    # Esperar a que las fuentes del texto estén listas (en lugar de una espera fija)
+    page.evaluate('document.fonts.ready.then(() => true)')
+
+    # Generar PDF en memoria (solo se escribe a disco si se indicó output_path)
+    # Tamaño A4 horizontal (landscape) para certificados
+    pdf_bytes = page.pdf(
+        path=output_path,
+        format='A4',
+        landscape=True,
+        print_background=True,
+        margin={
+            'top': '0',
+            'right': '0',
+            'bottom': '0',
+            'left': '0'
+        }
+    )
+
+    # Vista previa PNG reutilizando la misma página (sin lanzar otro navegador)
+    png_bytes = None
+    if tamano_preview:
+        ancho, alto = tamano_preview
+        page.set_viewport_size({'width': ancho, 'height': alto})
+        png_bytes = page.screenshot(type='png')
+
+    return pdf_bytes, png_bytes
 
 
 def html_to_pdf(html_content: str, output_path: str = None, width: int = 1920, height: int = 1080) -> str:
@@ -139,11 +362,6 @@ def html_to_pdf(html_content: str, output_path: str = None, width: int = 1920, h
         fd, output_path = tempfile.mkstemp(suffix='.pdf')
         os.close(fd)
 
-    # Crear archivo HTML temporal
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as tmp:
-        tmp.write(html_content)
-        html_path = tmp.name
-
     try:
         with sync_playwright() as p:
             # Iniciar navegador
@@ -159,12 +377,9 @@ def html_to_pdf(html_content: str, output_path: str = None, width: int = 1920, h
 
             page = browser.new_page(viewport={'width': width, 'height': height})
 
-            # Cargar el HTML
-            page.goto(f'file://{html_path}')
-
-            # Esperar a que todo se cargue
-            page.wait_for_load_state('networkidle')
-            page.wait_for_timeout(2000)
+            # Cargar el HTML directamente y esperar a que todo se cargue (red y fuentes; sin espera fija)
+            page.set_content(html_content, wait_until='networkidle')
+            page.evaluate('document.fonts.ready.then(() => true)')
 
             # Generar PDF
             page.pdf(
@@ -188,12 +403,6 @@ def html_to_pdf(html_content: str, output_path: str = None, width: int = 1920, h
     except Exception as e:
         logger.error(f"Error al generar PDF: {e}")
         raise
-    finally:
-        # Limpiar archivo HTML temporal
-        try:
-            os.unlink(html_path)
-        except:
-            pass
 
 
 if __name__ == '__main__':
@@ -207,5 +416,5 @@ if __name__ == '__main__':
     </svg>
     """
 
-    pdf_path = svg_to_pdf(test_svg, '/tmp/test.pdf')
-    print(f"PDF generado: {pdf_path}")
+    pdf_bytes = svg_to_pdf(test_svg, '/tmp/test.pdf')
+    print(f"PDF generado: /tmp/test.pdf ({len(pdf_bytes)} bytes)")
@@ -1,9 +1,17 @@
 """
 Schemas de validación con Pydantic
+
+Frontera de confianza:
+    - Entrada no confiable (/generar-certificados): se parsea y valida
+      completa con msgspec (GenerarCertificadosStruct) en una sola pasada.
+    - Entrada de confianza (panel admin con sesión, llamadas internas): se
+      construye con ParticipanteSchema.model_construct(), sin validación.
 """
-from pydantic import BaseModel, EmailStr, Field, validator
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
+from typing import Annotated, List, Optional
 from datetime import datetime
+import msgspec
+from email_validator import validate_email
 
 
 class ParticipanteSchema(BaseModel):
@@ -11,63 +19,95 @@ class ParticipanteSchema(BaseModel):
     nombre: str = Field(..., min_length=1, max_length=255, description="Nombre completo del participante")
     email: EmailStr = Field(..., description="Email del participante")
 
-    @validator('nombre')
+    @field_validator('nombre')
+    @classmethod
     def validar_nombre(cls, v):
         """Valida que el nombre no esté vacío y no contenga solo espacios"""
         if not v or v.strip() == '':
             raise ValueError('El nombre no puede estar vacío')
         return v.strip()
 
-    class Config:
-        schema_extra = {
-            "example": {
-                "nombre": "Juan Pérez",
-                "email": "juan.perez@example.com"
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "nombre": "Juan Pérez",
+            "email": "juan.perez@example.com"
         }
+    })
 
 
 class GenerarCertificadosRequest(BaseModel):
     """Schema para el request de generación de certificados"""
-    participantes: List[ParticipanteSchema] = Field(..., min_items=1, description="Lista de participantes")
+    participantes: List[ParticipanteSchema] = Field(..., min_length=1, description="Lista de participantes")
 
-    @validator('participantes')
+    @field_validator('participantes')
+    @classmethod
     def validar_limite_participantes(cls, v):
         """Valida que no se exceda el límite de participantes por batch"""
         if len(v) > 1000:
             raise ValueError('El límite máximo es 1000 participantes por batch')
         return v
 
-    class Config:
-        schema_extra = {
-            "example": {
-                "participantes": [
-                    {"nombre": "Juan Pérez", "email": "juan@example.com"},
-                    {"nombre": "María García", "email": "maria@example.com"}
-                ]
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "participantes": [
+                {"nombre": "Juan Pérez", "email": "juan@example.com"},
+                {"nombre": "María García", "email": "maria@example.com"}
+            ]
         }
+    })
+
+
+class ParticipanteStruct(msgspec.Struct):
+    """
+    Participante decodificado con msgspec.
+
+    Ruta rápida de /generar-certificados: parsea y valida en una sola pasada
+    sin construir diccionarios intermedios.
+    """
+    nombre: Annotated[str, msgspec.Meta(min_length=1, max_length=255)]
+    email: Annotated[str, msgspec.Meta(max_length=255)]
+
+    def __post_init__(self):
+        """Valida el nombre (no vacío ni solo espacios) y el email (como EmailStr)"""
+        self.nombre = self.nombre.strip()
+        if not self.nombre:
+            raise ValueError('El nombre no puede estar vacío')
+
+        # Misma validación que EmailStr de Pydantic (EmailNotValidError es un ValueError)
+        self.email = validate_email(self.email, check_deliverability=False).normalized
+
+
+class GenerarCertificadosStruct(msgspec.Struct, frozen=True):
+    """Request de generación de certificados decodificado con msgspec"""
+    participantes: Annotated[
+        List[ParticipanteStruct],
+        msgspec.Meta(min_length=1, max_length=1000)
+    ]
+
+
+# Decoder precompilado para el body de /generar-certificados
+generar_certificados_decoder = msgspec.json.Decoder(GenerarCertificadosStruct)
 
 
 class EnviarEmailsRequest(BaseModel):
     """Schema para el request de envío de emails"""
-    slugs: List[str] = Field(..., min_items=1, description="Lista de slugs de certificados")
+    slugs: List[str] = Field(..., min_length=1, description="Lista de slugs de certificados")
     asunto: Optional[str] = Field(None, max_length=200, description="Asunto personalizado")
 
-    @validator('slugs')
+    @field_validator('slugs')
+    @classmethod
     def validar_limite_emails(cls, v):
         """Valida que no se exceda el límite de emails por batch"""
         if len(v) > 1000:
             raise ValueError('El límite máximo es 1000 emails por batch')
         return v
 
-    class Config:
-        schema_extra = {
-            "example": {
-                "slugs": ["juan-perez", "maria-garcia"],
-                "asunto": "Tu certificado está listo"
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "slugs": ["juan-perez", "maria-garcia"],
+            "asunto": "Tu certificado está listo"
         }
+    })
 
 
 class CertificadoResponse(BaseModel):
@@ -82,20 +122,19 @@ class CertificadoResponse(BaseModel):
     ultima_visita: Optional[str]
     url: str
 
-    class Config:
-        schema_extra = {
-            "example": {
-                "id": 1,
-                "slug": "juan-perez",
-                "nombre": "Juan Pérez",
-                "email": "juan@example.com",
-                "cloudinary_url": "https://res.cloudinary.com/...",
-                "fecha_generacion": "2024-01-15 10:30:00",
-                "visto": 5,
-                "ultima_visita": "2024-01-20 15:45:00",
-                "url": "/certificado/juan-perez"
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "id": 1,
+            "slug": "juan-perez",
+            "nombre": "Juan Pérez",
+            "email": "juan@example.com",
+            "cloudinary_url": "https://res.cloudinary.com/...",
+            "fecha_generacion": "2024-01-15 10:30:00",
+            "visto": 5,
+            "ultima_visita": "2024-01-20 15:45:00",
+            "url": "/certificado/juan-perez"
         }
+    })
 
 
 class GenerarResponse(BaseModel):
@@ -105,23 +144,22 @@ class GenerarResponse(BaseModel):
     errores: int
     resultados: List[dict]
 
-    class Config:
-        schema_extra = {
-            "example": {
-                "total": 2,
-                "exitosos": 2,
-                "errores": 0,
-                "resultados": [
-                    {
-                        "nombre": "Juan Pérez",
-                        "email": "juan@example.com",
-                        "slug": "juan-perez",
-                        "url": "/certificado/juan-perez",
-                        "success": True
-                    }
-                ]
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "total": 2,
+            "exitosos": 2,
+            "errores": 0,
+            "resultados": [
+                {
+                    "nombre": "Juan Pérez",
+                    "email": "juan@example.com",
+                    "slug": "juan-perez",
+                    "url": "/certificado/juan-perez",
+                    "success": True
+                }
+            ]
         }
+    })
 
 
 class EmailResponse(BaseModel):
@@ -131,17 +169,16 @@ class EmailResponse(BaseModel):
     errores: int
     resultados: List[dict]
 
-    class Config:
-        schema_extra = {
-            "example": {
-                "total": 2,
-                "exitosos": 2,
-                "errores": 0,
-                "resultados": [
-                    {"email": "juan@example.com", "success": True}
-                ]
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "total": 2,
+            "exitosos": 2,
+            "errores": 0,
+            "resultados": [
+                {"email": "juan@example.com", "success": True}
+            ]
         }
+    })
 
 
 class ErrorResponse(BaseModel):
@@ -149,10 +186,9 @@ class ErrorResponse(BaseModel):
     error: str
     details: Optional[str] = None
 
-    class Config:
-        schema_extra = {
-            "example": {
-                "error": "Certificado no encontrado",
-                "details": "El slug 'juan-perez' no existe en la base de datos"
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "error": "Certificado no encontrado",
+            "details": "El slug 'juan-perez' no existe en la base de datos"
         }
+    })
@@ -1,15 +1,92 @@
 """
 Utilidades de seguridad para la aplicación
 """
-import re
+import ipaddress
+import string
 import logging
-from functools import wraps
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
 from flask import request, jsonify
 from urllib.parse import urlparse
 from config import config
 
 logger = logging.getLogger(__name__)
 
+# Caracteres permitidos en un slug: letras minúsculas, números, guiones y underscore
+SLUG_CHARS = frozenset(string.ascii_lowercase + string.digits + '-_')
+SLUG_MAX_LENGTH = 100
+
+# Dominios permitidos de Cloudinary (y sus subdominios, comprobados con endswith)
+CLOUDINARY_DOMAINS = frozenset({'res.cloudinary.com', 'cloudinary.com'})
+CLOUDINARY_SUFIJOS = tuple('.' + dominio for dominio in CLOUDINARY_DOMAINS)
+
+# IPs de administración permitidas: direcciones exactas (conjunto, búsqueda O(1))
+# y rangos CIDR (ej: 10.0.0.0/24), parseados una sola vez al importar
+def _parsear_ip(ip: str):
+    """
+    Convierte una IP en texto a ipaddress, con las IPv4 mapeadas en IPv6
+    (::ffff:1.2.3.4) como su IPv4, para comparar direcciones y no su escritura
+
+    Returns:
+        La dirección o None si no es una IP válida
+    """
+    try:
+        direccion = ipaddress.ip_address(ip.strip())
+    except ValueError:
+        return None
+    return getattr(direccion, 'ipv4_mapped', None) or direccion
+
+
+def _parsear_ips(ips):
+    """Convierte las direcciones exactas de ADMIN_ALLOWED_IPS (ignora las inválidas)"""
+    direcciones = set()
+    for ip in ips:
+        if not ip.strip() or '/' in ip:
+            continue
+        direccion = _parsear_ip(ip)
+        if direccion is None:
+            logger.warning(f"IP inválida en ADMIN_ALLOWED_IPS ignorada: {ip}")
+            continue
+        direcciones.add(direccion)
+    return frozenset(direcciones)
+
+
+def _parsear_redes(ips):
+    """Convierte las entradas CIDR de ADMIN_ALLOWED_IPS en redes (ignora las inválidas)"""
+    redes = []
+    for ip in ips:
+        if '/' not in ip:
+            continue
+        try:
+            redes.append(ipaddress.ip_network(ip.strip(), strict=False))
+        except ValueError:
+            logger.warning(f"Rango inválido en ADMIN_ALLOWED_IPS ignorado: {ip}")
+    return tuple(redes)
+
+
+ADMIN_IPS = _parsear_ips(config.ADMIN_ALLOWED_IPS)
+ADMIN_REDES = _parsear_redes(config.ADMIN_ALLOWED_IPS)
+
+
+def ip_admin_permitida(client_ip: str) -> bool:
+    """
+    Indica si una IP está en ADMIN_ALLOWED_IPS (dirección exacta o dentro de un rango CIDR)
+
+    Args:
+        client_ip: IP del cliente
+
+    Returns:
+        True si la IP está permitida
+    """
+    direccion = _parsear_ip(client_ip)
+    if direccion is None:
+        return False
+    if direccion in ADMIN_IPS:
+        return True
+    return any(direccion in red for red in ADMIN_REDES)
+
 
 def require_admin_ip(f):
     """
@@ -36,7 +113,7 @@ def require_admin_ip(f):
                 }), 403
 
         # Verificar si la IP está en la lista permitida
-        if config.ADMIN_ALLOWED_IPS and client_ip not in config.ADMIN_ALLOWED_IPS:
+        if config.ADMIN_ALLOWED_IPS and not ip_admin_permitida(client_ip):
             logger.warning(f"Acceso denegado desde IP no autorizada: {client_ip} (configuradas: {config.ADMIN_ALLOWED_IPS})")
             return jsonify({
                 'error': 'Acceso denegado',
@@ -66,20 +143,20 @@ def validate_slug(slug: str) -> bool:
         return False
 
     # Solo permitir: letras minúsculas, números, guiones y underscore
-    # Longitud máxima 100 caracteres
-    pattern = r'^[a-z0-9\-_]{1,100}$'
-
-    if not re.match(pattern, slug):
+    # Longitud máxima 100 caracteres (comprobación por conjunto, sin regex)
+    if len(slug) > SLUG_MAX_LENGTH or not SLUG_CHARS.issuperset(slug):
         logger.warning(f"Slug inválido rechazado: {slug}")
         return False
 
-    # Prevenir slugs que sean solo puntos o guiones
-    if slug in ['.', '..', '-', '--']:
+    # Prevenir slugs que sean solo guiones
+    if slug in ('-', '--'):
         return False
 
     return True
 
 
+# Las URLs vienen de la BD y se repiten en cada vista del mismo certificado
+@lru_cache(maxsize=4096)
 def validate_cloudinary_url(url: str) -> bool:
     """
     Valida que una URL sea de Cloudinary.
@@ -104,16 +181,9 @@ def validate_cloudinary_url(url: str) -> bool:
             logger.warning(f"URL rechazada (no HTTPS): {url}")
             return False
 
-        # Dominios permitidos de Cloudinary
-        allowed_domains = [
-            'res.cloudinary.com',
-            'cloudinary.com'
-        ]
-
         # Verificar que el dominio esté en la lista permitida
         hostname = parsed.netloc.lower()
-        is_valid = any(hostname == domain or hostname.endswith('.' + domain)
-                      for domain in allowed_domains)
+        is_valid = hostname in CLOUDINARY_DOMAINS or hostname.endswith(CLOUDINARY_SUFIJOS)
 
         if not is_valid:
             logger.warning(f"URL rechazada (dominio no permitido): {url}")
@@ -125,6 +195,58 @@ def validate_cloudinary_url(url: str) -> bool:
         return False
 
 
+class LimitadorLocal:
+    """
+    Token bucket en memoria por clave (IP).
+
+    Se usa como primera barrera, antes del limiter compartido en Redis:
+    descarta ráfagas evidentes sin hacer un round-trip al storage.
+    """
+
+    # Número máximo de claves: al superarlo se elimina la usada hace más tiempo (LRU)
+    MAX_CLAVES = 10000
+
+    def __init__(self, capacidad: int, tokens_por_segundo: float):
+        """
+        Args:
+            capacidad: Máximo de tokens (tamaño de ráfaga permitido)
+            tokens_por_segundo: Velocidad de recarga
+        """
+        self.capacidad = capacidad
+        self.tokens_por_segundo = tokens_por_segundo
+        self._buckets: OrderedDict = OrderedDict()  # clave -> [tokens, último acceso], en orden de uso
+        self._lock = threading.Lock()
+
+    def permitir(self, clave: str) -> bool:
+        """
+        Consume un token de la clave si hay disponible
+
+        Args:
+            clave: Identificador del cliente (IP)
+
+        Returns:
+            True si la petición se admite, False si debe rechazarse
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(clave)
+            if bucket is None:
+                # O(1) aunque lleguen muchas IPs distintas: se descarta solo la menos reciente
+                if len(self._buckets) >= self.MAX_CLAVES:
+                    self._buckets.popitem(last=False)
+                bucket = self._buckets[clave] = [self.capacidad, ahora]
+            else:
+                self._buckets.move_to_end(clave)
+                # Recarga perezosa según el tiempo transcurrido
+                bucket[0] = min(self.capacidad, bucket[0] + (ahora - bucket[1]) * self.tokens_por_segundo)
+                bucket[1] = ahora
+
+            if bucket[0] < 1:
+                return False
+            bucket[0] -= 1
+            return True
+
+
 def sanitize_error_message(error: Exception, debug: bool = False) -> str:
     """
     Sanitiza mensajes de error para no revelar información sensible.
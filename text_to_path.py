@@ -1,10 +1,56 @@
 """
 Convierte texto a paths SVG usando fonttools
 """
+from collections import namedtuple
+from functools import lru_cache
+from itertools import accumulate
+from typing import Iterator, Tuple, Union
 from fontTools.ttLib import TTFont
 from fontTools.pens.svgPathPen import SVGPathPen
-from xml.etree import ElementTree as ET
+from lxml import etree
+import logging
+import os
 import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Posición ("translate(420.94 270)") y tamaño de fuente de los <text> del template
+TRANSLATE_RE = re.compile(r'translate\(([0-9.]+)\s+([0-9.]+)\)')
+FONT_SIZE_RE = re.compile(r'font-size:\s*([0-9.]+)px')
+
+# Color de relleno de los paths generados, compartido por todos los glyphs
+COLOR_GLYPH = '#010101'
+
+# Plantillas del transform de cada glyph (x, y, escala, escala) y del <path> resultante
+TRANSFORM_GLYPH = 'translate(%.2f,%.2f) scale(%.4f,-%.4f)'
+PATH_SVG = '<path d="%s" transform="%s" fill="' + COLOR_GLYPH + '"/>'
+
+# Parser lxml de cada hilo (un mismo parser no debe usarse desde varios hilos a la vez)
+_parsers = threading.local()
+
+# Fuente ya cargada con las tablas que usa text_to_svg_paths
+# (paths_glyph: nombre del glyph -> comandos del path en unidades de la fuente, sin escalar)
+FuenteCargada = namedtuple('FuenteCargada', ['font', 'glyph_set', 'cmap', 'units_per_em', 'paths_glyph'])
+
+
+@lru_cache(maxsize=8)
+def _cargar_fuente(font_path: str, mtime: float) -> FuenteCargada:
+    """
+    Carga y parsea una fuente una sola vez por proceso (se recarga si cambia en disco)
+
+    Con lazy=False todas las tablas se decompilan al cargar, así la fuente
+    compartida solo se lee después y puede usarse desde varios hilos.
+    """
+    font = TTFont(font_path, lazy=False)
+
+    return FuenteCargada(
+        font=font,
+        glyph_set=font.getGlyphSet(),
+        cmap=font.getBestCmap(),
+        units_per_em=font['head'].unitsPerEm,
+        paths_glyph={}
+    )
 
 
 def text_to_svg_paths(text: str, font_path: str, font_size: float = 38, x: float = 0, y: float = 0, text_anchor: str = 'middle') -> str:
@@ -22,39 +68,30 @@ def text_to_svg_paths(text: str, font_path: str, font_size: float = 38, x: float
     Returns:
         String con elementos <path> SVG
     """
-    # Cargar la fuente
-    font = TTFont(font_path)
-
-    # Obtener la tabla de glyphs y métricas
-    glyph_set = font.getGlyphSet()
-    units_per_em = font['head'].unitsPerEm
-    scale = font_size / units_per_em
-
-    # Obtener tabla de kerning si existe
-    kern_table = {}
-    if 'GPOS' in font:
-        # GPOS table for kerning (modern fonts)
-        pass
-    elif 'kern' in font:
-        # Legacy kern table
-        kern_table = font['kern'].kernTables[0].kernTable if font['kern'].kernTables else {}
-
-    # Calcular el ancho total del texto
-    total_width = 0
-    glyph_names = []
-    glyph_widths = []
-
-    for char in text:
-        # Obtener el nombre del glyph para este carácter
-        cmap = font.getBestCmap()
-        glyph_name = cmap.get(ord(char), '.notdef')
-        glyph_names.append(glyph_name)
-
-        # Obtener el ancho del glyph
-        glyph = glyph_set[glyph_name]
-        width = glyph.width * scale
-        glyph_widths.append(width)
-        total_width += width
+    return '\n'.join(
+        PATH_SVG % path_glyph
+        for path_glyph in _paths_glyphs(text, font_path, font_size, x, y, text_anchor)
+    )
+
+
+def _paths_glyphs(text: str, font_path: str, font_size: float, x: float, y: float, text_anchor: str) -> Iterator[Tuple[str, str]]:
+    """
+    Calcula el path de cada glyph visible del texto (ver text_to_svg_paths)
+
+    Yields:
+        Tupla (comandos del path, transform) de cada glyph
+    """
+    # Fuente, glyphs, cmap y métricas cacheados por proceso
+    fuente = _cargar_fuente(font_path, os.path.getmtime(font_path))
+    glyph_set = fuente.glyph_set
+    cmap = fuente.cmap
+    paths_glyph = fuente.paths_glyph
+    scale = font_size / fuente.units_per_em
+
+    # Nombre y ancho de cada glyph, y ancho total del texto
+    glyph_names = [cmap.get(ord(char), '.notdef') for char in text]
+    glyph_widths = [glyph_set[glyph_name].width * scale for glyph_name in glyph_names]
+    total_width = sum(glyph_widths)
 
     # Ajustar posición inicial según text-anchor
     if text_anchor == 'middle':
@@ -64,80 +101,91 @@ def text_to_svg_paths(text: str, font_path: str, font_size: float = 38, x: float
     else:  # 'start'
         current_x = x
 
-    # Generar paths para cada glyph
-    paths = []
+    # Posición x de cada glyph: la inicial más los anchos de los glyphs anteriores
+    posiciones_x = accumulate(glyph_widths, initial=current_x)
 
-    for i, (char, glyph_name, width) in enumerate(zip(text, glyph_names, glyph_widths)):
+    # Generar paths para cada glyph
+    for char, glyph_name, glyph_x in zip(text, glyph_names, posiciones_x):
         if glyph_name == '.notdef' or char == ' ':
-            current_x += width
             continue
 
-        # Crear un SVGPathPen para extraer el path del glyph
-        pen = SVGPathPen(glyph_set)
-        glyph = glyph_set[glyph_name]
-        glyph.draw(pen)
+        # Path del glyph (se dibuja una sola vez por fuente y se reutiliza)
+        path_data = paths_glyph.get(glyph_name)
+        if path_data is None:
+            pen = SVGPathPen(glyph_set)
+            glyph_set[glyph_name].draw(pen)
+            path_data = paths_glyph[glyph_name] = pen.getCommands()
+
+        # Glyph sin contorno: no genera path
+        if not path_data:
+            continue
 
-        # Obtener el path string
-        path_data = pen.getCommands()
+        # Aplicar transformaciones: escala, posición
+        # Los glyphs están en coordenadas de fuente, necesitamos transformarlos
+        yield path_data, TRANSFORM_GLYPH % (glyph_x, y, scale, scale)
 
-        if path_data:
-            # Aplicar transformaciones: escala, posición
-            # Los glyphs están en coordenadas de fuente, necesitamos transformarlos
-            transform = f"translate({current_x:.2f},{y:.2f}) scale({scale:.4f},-{scale:.4f})"
 
-            paths.append(f'<path d="{path_data}" transform="{transform}" fill="#010101"/>')
+def _obtener_parser() -> etree.XMLParser:
+    """
+    Obtiene el parser XML del hilo actual
 
-        current_x += width
+    Descarta los comentarios y no expande entidades.
+    """
+    parser = getattr(_parsers, 'parser', None)
+    if parser is None:
+        parser = _parsers.parser = etree.XMLParser(
+            remove_comments=True,
+            resolve_entities=False,
+            huge_tree=True
+        )
+    return parser
 
-    return '\n'.join(paths)
 
+def _como_texto(svg_content: Union[str, bytes]) -> str:
+    """Devuelve el SVG como string, decodificándolo si viene en bytes UTF-8"""
+    if isinstance(svg_content, bytes):
+        return svg_content.decode('utf-8')
+    return svg_content
 
-def convert_svg_text_to_paths(svg_content: str, font_path: str) -> str:
+
+def convert_svg_text_to_paths(svg_content: Union[str, bytes], font_path: str) -> str:
     """
     Convierte los elementos <text> en un SVG a <path> usando la fuente especificada.
 
     Args:
-        svg_content: Contenido del SVG como string
+        svg_content: Contenido del SVG como string, o ya codificado en UTF-8
+                     (el parser trabaja sobre bytes y así no hay que copiarlo)
         font_path: Ruta al archivo .ttf de la fuente
 
     Returns:
         SVG con texto convertido a paths
     """
-    # Registrar namespaces ANTES de parsear para preservarlos
-    ET.register_namespace('', 'http://www.w3.org/2000/svg')
-    ET.register_namespace('xlink', 'http://www.w3.org/1999/xlink')
+    parser = _obtener_parser()
+
+    if isinstance(svg_content, str):
+        svg_bytes = svg_content.encode('utf-8')
+    else:
+        svg_bytes = svg_content
 
     try:
-        root = ET.fromstring(svg_content.encode('utf-8'))
-    except ET.ParseError as e:
-        # Si falla, intentar limpiando namespaces
-        svg_content_clean = re.sub(r'\sxmlns="[^"]+"', '', svg_content, count=1)
-        try:
-            root = ET.fromstring(svg_content_clean.encode('utf-8'))
-        except ET.ParseError:
-            # Si aún falla, devolver el contenido original
-            print(f"Error al parsear SVG: {e}")
-            return svg_content
-
-    # Buscar todos los elementos <text> con namespace correcto
-    # Usar búsqueda con namespace explícito
-    ns = {'svg': 'http://www.w3.org/2000/svg'}
-    text_elements = root.findall('.//{http://www.w3.org/2000/svg}text')
-
-    # Si no encuentra con namespace, buscar sin él
-    if not text_elements:
-        text_elements = root.findall('.//text')
+        root = etree.fromstring(svg_bytes, parser)
+    except etree.ParseError as e:
+        # SVG mal formado: devolver el contenido original (nunca un árbol parcial)
+        logger.error(f"Error al parsear SVG: {e}")
+        return _como_texto(svg_content)
+
+    # Buscar todos los elementos <text>, con el namespace SVG solo si el documento lo usa
+    # (se detecta una vez en la raíz en lugar de repetir cada búsqueda sin namespace)
+    # Solo se convierten los que usan Montserrat: el filtro lo hace libxml2 (XPath)
+    ns = '{http://www.w3.org/2000/svg}' if root.tag.startswith('{') else ''
+    text_elements = root.xpath(
+        f'.//{"svg:" if ns else ""}text[contains(@style, "Montserrat")]',
+        namespaces={'svg': 'http://www.w3.org/2000/svg'}
+    )
 
     for text_elem in text_elements:
-        # Solo convertir elementos que usan Montserrat
-        style = text_elem.get('style', '')
-        if 'Montserrat' not in style:
-            continue
-
         # Buscar el tspan dentro del text
-        tspan = text_elem.find('.//{http://www.w3.org/2000/svg}tspan')
-        if tspan is None:
-            tspan = text_elem.find('.//tspan')
+        tspan = text_elem.find(f'.//{ns}tspan')
 
         if tspan is None or not tspan.text:
             continue
@@ -148,7 +196,7 @@ def convert_svg_text_to_paths(svg_content: str, font_path: str) -> str:
 
         # Extraer posición del transform
         # Formato: "translate(420.94 270)"
-        match = re.search(r'translate\(([0-9.]+)\s+([0-9.]+)\)', transform_attr)
+        match = TRANSLATE_RE.search(transform_attr)
         if match:
             x = float(match.group(1))
             y = float(match.group(2))
@@ -162,48 +210,26 @@ def convert_svg_text_to_paths(svg_content: str, font_path: str) -> str:
         # Extraer tamaño de fuente del style o atributo
         style = text_elem.get('style', '')
         font_size = 38  # default
-        size_match = re.search(r'font-size:\s*([0-9.]+)px', style)
+        size_match = FONT_SIZE_RE.search(style)
         if size_match:
             font_size = float(size_match.group(1))
 
-        # Convertir texto a paths
-        paths_svg = text_to_svg_paths(
-            text_content,
-            font_path,
-            font_size=font_size,
-            x=x,
-            y=y,
-            text_anchor=text_anchor
-        )
-
         # Crear un grupo para contener los paths
-        group = ET.Element('g')
+        group = etree.Element('g')
         group.set('id', 'converted-text')
 
-        # Parsear los paths y agregarlos al grupo
-        for path_line in paths_svg.split('\n'):
-            if path_line.strip():
-                try:
-                    path_elem = ET.fromstring(path_line)
-                    group.append(path_elem)
-                except ET.ParseError:
-                    # Si falla el parsing de un path, continuar con el siguiente
-                    continue
+        # Convertir texto a paths, creando los elementos directamente en el grupo
+        for path_data, transform in _paths_glyphs(text_content, font_path, font_size, x, y, text_anchor):
+            etree.SubElement(group, 'path', d=path_data, transform=transform, fill=COLOR_GLYPH)
 
         # Reemplazar el elemento text con el grupo
-        parent = None
-        for elem in root.iter():
-            if text_elem in list(elem):
-                parent = elem
-                break
+        parent = text_elem.getparent()
 
         if parent is not None:
-            index = list(parent).index(text_elem)
-            parent.remove(text_elem)
-            parent.insert(index, group)
+            parent.replace(text_elem, group)
 
     # Convertir de vuelta a string preservando namespaces
-    result = ET.tostring(root, encoding='unicode', method='xml')
+    result = etree.tostring(root, encoding='unicode', method='xml')
 
     # Agregar declaración XML si no existe
     if not result.startswith('<?xml'):
@@ -5,6 +5,13 @@ Utilidades para el generador de certificados
 import re
 import unicodedata
 
+# Expresión regular de nombre_to_slug, compilada una sola vez. Al ser greedy ya
+# convierte cada tramo de caracteres no válidos (guiones incluidos) en un único guión
+NO_ALFANUMERICO_RE = re.compile(r'[^a-z0-9]+')
+
+# Slugs candidatos ("frank-vargas", "frank-vargas-2", ...) verificados en cada consulta a la BD
+SLUGS_POR_CONSULTA = 10
+
 
 def nombre_to_slug(nombre):
     """
@@ -24,23 +31,19 @@ def nombre_to_slug(nombre):
     # Convertir a minúsculas
     slug = nombre.lower()
 
-    # Normalizar caracteres (quitar acentos)
-    slug = unicodedata.normalize('NFKD', slug)
-    slug = slug.encode('ascii', 'ignore').decode('ascii')
+    # Normalizar caracteres (quitar acentos); un nombre ASCII no tiene nada que normalizar
+    if not slug.isascii():
+        slug = unicodedata.normalize('NFKD', slug)
+        slug = slug.encode('ascii', 'ignore').decode('ascii')
 
     # Reemplazar espacios y caracteres especiales con guiones
-    slug = re.sub(r'[^a-z0-9]+', '-', slug)
+    slug = NO_ALFANUMERICO_RE.sub('-', slug)
 
     # Eliminar guiones al inicio y final
-    slug = slug.strip('-')
-
-    # Reemplazar múltiples guiones consecutivos con uno solo
-    slug = re.sub(r'-+', '-', slug)
-
-    return slug
+    return slug.strip('-')
 
 
-def generar_slug_unico(nombre, database):
+def generar_slug_unico(nombre, database, reservados=None):
     """
     Genera un slug único para un nombre, agregando número si ya existe
 
@@ -52,17 +55,31 @@ def generar_slug_unico(nombre, database):
     Args:
         nombre: Nombre de la persona
         database: Instancia de Database para verificar existencia
+        reservados: Set de slugs ya asignados pero aún no guardados (batch);
+                    el slug generado se agrega al set
 
     Returns:
         slug único
     """
     base_slug = nombre_to_slug(nombre)
-    slug = base_slug
-    contador = 2
 
-    # Verificar si el slug ya existe en la base de datos
-    while database.obtener_certificado(slug) is not None:
-        slug = f"{base_slug}-{contador}"
-        contador += 1
+    # El contador 1 corresponde al slug base, sin número
+    contador = 1
+
+    while True:
+        # Verificar un bloque de candidatos con una sola consulta a la base de datos
+        candidatos = [
+            base_slug if n == 1 else f"{base_slug}-{n}"
+            for n in range(contador, contador + SLUGS_POR_CONSULTA)
+        ]
+        ocupados = database.obtener_slugs_existentes(candidatos)
+
+        for slug in candidatos:
+            # El slug tampoco puede estar asignado ya en el batch en curso
+            if slug not in ocupados and (reservados is None or slug not in reservados):
+                if reservados is not None:
+                    reservados.add(slug)
+
+                return slug
 
-    return slug
+        contador += SLUGS_POR_CONSULTA
@@ -0,0 +1,9 @@
+"""
+Punto de entrada WSGI para producción (gunicorn + gevent)
+Uso: gunicorn -c gunicorn.conf.py wsgi:application
+"""
+# Parchear antes de cualquier import para que requests, redis y la BD cedan en I/O
+from gevent import monkey
+monkey.patch_all()
+
+from app import app as application  # noqa: E402